@@ -0,0 +1,53 @@
+"""
+Benchmark: startup cost of engicalc.
+
+Run with ``python benchmarks/bench_import_time.py``. Every measurement runs in
+a fresh interpreter, so nothing is imported yet. The unit registry is built
+from pint's cache folder after the first start.
+"""
+
+import subprocess
+import sys
+
+REPEAT = 5
+
+TIMED = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+FIRST_PUT_OUT = """
+import time
+from IPython.core.interactiveshell import InteractiveShell
+shell = InteractiveShell.instance()
+shell.run_cell("from engicalc import *\\nimport engicalc.output\\nimport numpy as np", store_history=True)
+shell.user_ns['engicalc'].output.display_markdown = lambda markdown_str: None
+start = time.perf_counter()
+shell.run_cell("import engicalc.units as un\\nb_w = 0.3*un.m\\nA = np.sqrt(b_w**2 / 2)\\nput_out(symbolic=True)", store_history=True)
+print(time.perf_counter() - start)
+"""
+
+CASES = {
+    "import engicalc": TIMED.format(statement="import engicalc"),
+    "import engicalc.units": TIMED.format(statement="import engicalc.units"),
+    "first put_out()": FIRST_PUT_OUT,
+}
+
+
+def measure(code):
+    times = []
+    for _ in range(REPEAT):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+
+def main():
+    for label, code in CASES.items():
+        print(f"{label:>22}: {measure(code) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
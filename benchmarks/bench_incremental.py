@@ -0,0 +1,57 @@
+"""
+Benchmark: re-running and recomputing a large sheet incrementally.
+
+Run with ``python benchmarks/bench_incremental.py``. A synthetic sheet of 400
+cells (see bench_sheets.py) is run once, then run again unchanged, where the
+equations are reused, and then an input is changed and only its downstream
+variables are recomputed with recompute().
+"""
+
+import time
+
+from IPython.core.interactiveshell import InteractiveShell
+
+import engicalc.output as output
+from bench_sheets import sheet
+
+N_CELLS = 400
+
+
+def run(shell, cells):
+    start = time.perf_counter()
+    for cell in cells:
+        shell.run_cell(cell, store_history=True)
+    return time.perf_counter() - start
+
+
+def recompute(shell, name):
+    shell.run_cell(f"_recomputed = recompute('{name}')", store_history=True)
+    start = time.perf_counter()
+    shell.run_cell(f"_recomputed = recompute('{name}')", store_history=True)
+    return time.perf_counter() - start, len(shell.user_ns['_recomputed'])
+
+
+def main():
+    # The Markdown output is not of interest here
+    output.display_markdown = lambda markdown_str: None
+    shell = InteractiveShell.instance()
+    cells = sheet(N_CELLS * 10)
+
+    stats = output.enable_render_stats()
+    print(f"first run:  {run(shell, cells):.2f} s")
+    before = dict(stats.counters)
+    print(f"second run: {run(shell, cells):.2f} s, "
+          f"{stats.counters.get('equations_reused', 0) - before.get('equations_reused', 0)} equations reused")
+    output.disable_render_stats()
+
+    # Variables with a small and a large downstream part of the sheet
+    table = output.global_expressions
+    sizes = {name: len(table.downstream(name)) for name in table.names() if name.startswith('x_')}
+    sizes = {name: size for name, size in sizes.items() if size}
+    for name in (min(sizes, key=sizes.get), max(sizes, key=sizes.get)):
+        seconds, count = recompute(shell, name)
+        print(f"recompute('{name}'): {count} variables in {1e3 * seconds:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
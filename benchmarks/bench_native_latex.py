@@ -0,0 +1,100 @@
+"""
+Benchmark: native AST -> LaTeX renderer compared to the sympy path.
+
+Run with ``python benchmarks/bench_native_latex.py``. First the native output
+is checked against latex(sympify(...)) for a corpus of typical expressions
+(the script exits with 1 on a mismatch), then the throughput of both paths is
+measured in expressions per second.
+"""
+
+import sys
+import time
+
+import engicalc.output as output
+from engicalc.native import render_native
+
+KNOWN = [
+    'Theta_pl_A', 'm_u_A', 'm_y_A', 'l', 'b_w', 'EI_II', 'q_S1_A', 'alpha_u_A',
+    'Delta_apos_q_com_adm', 'q_u_A', 'M_apos', 'test_pint_unit', 'diam_apos_test_com_C',
+    'f_cd', 'f_ck', 'gamma_c', 'A_s', 'd', 'x', 'eps_s', 'E_s', 'sigma_s', 'N_Ed', 'M_Ed',
+]
+
+CORPUS = [
+    "5",
+    "0.1",
+    "1e-5",
+    "Theta_pl_A",
+    "Delta_apos_q_com_adm",
+    "diam_apos_test_com_C",
+    "np.sqrt(Theta_pl_A) / 2",
+    "((np.sin(alpha_u_A) + (m_u_A - m_y_A) * l * b_w / (3 * EI_II)) * 24 * EI_II / l**3)*un.m",
+    "Delta_apos_q_com_adm + q_S1_A*un.m",
+    "2 * alpha_u_A",
+    "30*un.mm",
+    "test_pint_unit.to(un.m)",
+    "f_ck / gamma_c",
+    "0.85 * f_ck / gamma_c",
+    "A_s * f_cd / (0.8 * b_w * f_cd)",
+    "M_Ed / (b_w * d**2 * f_cd)",
+    "eps_s * E_s",
+    "N_Ed / A_s + M_Ed / (A_s * d)",
+    "x - d / 2",
+    "d - 0.4 * x",
+    "(d - x) / x * 3.5e-3",
+    "np.sqrt(f_ck) * 0.3",
+    "math.sqrt(A_s / np.pi)",
+    "abs(M_Ed - N_Ed * d)",
+    "np.exp(-alpha_u_A * l)",
+    "np.cos(alpha_u_A)**2 + np.sin(alpha_u_A)**2",
+    "np.log(d / x)",
+    "1 / (1 + eps_s)",
+    "-N_Ed + M_Ed / d",
+    "A_s.m * f_cd.m",
+    "b_w * d * un.m**2",
+    "M_Ed * un.kNm / un.m",
+    "l**2 / 8",
+    "q_S1_A * l**2 / 8",
+    "sigma_s / E_s - eps_s",
+    "2 * (b_w + d)",
+    "np.pi * d**2 / 4",
+    "alpha_u_A ** 0.5",
+    "E_s @ eps_s",
+    "(f_ck + 8) ** (1 / 3)",
+]
+
+
+def main():
+    for name in KNOWN:
+        output.update_global_expressions(name, name, None)
+    known = tuple(KNOWN)
+
+    failures = 0
+    native_count = 0
+    for expr in CORPUS:
+        native = render_native(expr, known)
+        if native is None:
+            continue
+        native_count += 1
+        reference = output.format_sympy(expr, evaluate=False)
+        if native != reference:
+            failures += 1
+            print(f"MISMATCH {expr}\n  native: {native}\n  sympy:  {reference}")
+    print(f"parity: {native_count - failures}/{native_count} rendered natively and identical, "
+          f"{len(CORPUS) - native_count} left to sympy")
+
+    for label, render in (("sympy", lambda e: output.format_sympy(e, False)),
+                          ("native", lambda e: render_native(e, known))):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 2:
+            for expr in CORPUS:
+                render(expr)
+            count += len(CORPUS)
+        rate = count / (time.perf_counter() - start)
+        print(f"{label:>7}: {rate:10.0f} expressions/s")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Benchmark: re-running an unchanged sheet with the LaTeX render cache.
+
+Run with ``python benchmarks/bench_render_cache.py``. The first run fills the
+cache, the second run of the same cells should be dominated by cache hits.
+"""
+
+import time
+
+from IPython.core.interactiveshell import InteractiveShell
+
+import engicalc.output as output
+
+N_CELLS = 500
+
+
+def sheet(n_cells):
+    cells = ["from engicalc import *\nimport engicalc.units as un\nimport numpy as np\nq_0 = 1.5"]
+    for i in range(1, n_cells):
+        cells.append(
+            f"a_{i} = np.sqrt(q_{i - 1}) / 2\n"
+            f"q_{i} = (a_{i} + 3 * q_{i - 1}) * 1.05\n"
+            f"F_{i} = q_{i} * 2.5*un.kN\n"
+            "put_out(symbolic=True)"
+        )
+    return cells
+
+
+def run(shell, cells):
+    start = time.perf_counter()
+    for cell in cells:
+        shell.run_cell(cell, store_history=True)
+    return time.perf_counter() - start
+
+
+def main():
+    # The Markdown output is not of interest here
+    output.display_markdown = lambda markdown_str: None
+    shell = InteractiveShell.instance()
+    cells = sheet(N_CELLS)
+    output.clear_render_cache()
+    for label in ("first run", "second run"):
+        # Only the LaTeX cache is measured, not the reuse of whole equations
+        output.default_renderer.clear_cache()
+        before = output.render_cache_info()['symbolic']
+        seconds = run(shell, cells)
+        after = output.render_cache_info()['symbolic']
+        hits, misses = after.hits - before.hits, after.misses - before.misses
+        print(f"{label:>10}: {seconds:.2f} s, {hits} hits, {misses} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: synthetic calculation sheets of 10, 100 and 1000 assignments.
+
+Run with ``python benchmarks/bench_sheets.py [--sizes 10 100 1000] [--json FILE]``.
+The sheets are generated with a fixed seed and mix scalars, pint quantities
+and numpy arrays, ten assignments and one put_out per cell. Every size starts
+with empty render caches. The time per render stage (see engicalc.stats) is
+printed, --json writes it to a file to compare releases.
+"""
+
+import argparse
+import importlib.metadata
+import json
+import platform
+import random
+import time
+
+from IPython.core.interactiveshell import InteractiveShell
+
+import engicalc.output as output
+
+SEED = 42
+SIZES = (10, 100, 1000)
+CELL_SIZE = 10
+
+HEADER = "from engicalc import *\nimport engicalc.units as un\nimport numpy as np"
+UNITS = ('un.kN', 'un.m', 'un.mm', 'un.MPa', 'un.kNm')
+
+
+def scalar(rng, i, scalars):
+    if len(scalars) < 2:
+        return f"x_{i} = {rng.uniform(1, 100):.3f}"
+    a, b = rng.sample(scalars, 2)
+    return rng.choice((
+        f"x_{i} = {a} * {rng.uniform(0.5, 2):.2f} + {b}",
+        f"x_{i} = ({a} + {b}) / {rng.randint(2, 9)}",
+        f"x_{i} = np.sqrt({a}**2 + {b}**2)",
+        f"x_{i} = {a} * np.sin({b} / 100)",
+    ))
+
+
+def quantity(rng, i, scalars):
+    unit = rng.choice(UNITS)
+    if not scalars:
+        return f"F_{i} = {rng.uniform(1, 100):.2f} * {unit}"
+    return f"F_{i} = {rng.choice(scalars)} * {rng.uniform(0.5, 5):.2f} * {unit}"
+
+
+def array(rng, i, scalars):
+    start = rng.choice(scalars) if scalars else '0'
+    return f"A_{i} = np.linspace({start}, {start} + {rng.randint(1, 10)}, {rng.choice((3, 5, 8, 60))})"
+
+
+def sheet(n_assignments, seed=SEED):
+    """Returns the cells of a reproducible sheet with n_assignments."""
+    rng = random.Random(seed)
+    scalars = []
+    lines = []
+    for i in range(n_assignments):
+        kind = rng.choices((scalar, quantity, array), weights=(6, 3, 1))[0]
+        lines.append(kind(rng, i, scalars))
+        if kind is scalar:
+            scalars.append(f"x_{i}")
+    cells = [HEADER]
+    for start in range(0, n_assignments, CELL_SIZE):
+        cells.append('\n'.join(lines[start:start + CELL_SIZE]) + "\nput_out(symbolic=True)")
+    return cells
+
+
+def run(shell, cells):
+    shell.reset(new_session=True)
+    output.reset_expressions()
+    output.clear_render_cache()
+    stats = output.enable_render_stats()
+    start = time.perf_counter()
+    for cell in cells:
+        result = shell.run_cell(cell, store_history=True)
+        if not result.success:
+            raise RuntimeError(f"benchmark cell failed: {result.error_in_exec!r}\n{cell}")
+    seconds = time.perf_counter() - start
+    output.disable_render_stats()
+    return seconds, stats
+
+
+def version():
+    try:
+        return importlib.metadata.version('engicalc')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    # The Markdown output is not of interest here
+    output.display_markdown = lambda markdown_str: None
+    shell = InteractiveShell.instance()
+    # Warm-up, the imports of sympy, numpy and pint are not measured
+    run(shell, sheet(CELL_SIZE))
+
+    results = []
+    for size in args.sizes:
+        seconds, stats = run(shell, sheet(size))
+        equations = stats.counters.get('equations', 0)
+        print(f"\n{size} assignments: {seconds:.3f} s, "
+              f"{1e6 * seconds / max(equations, 1):.0f} us per equation")
+        print(stats.report())
+        results.append({'assignments': size, 'seconds': seconds, **stats.as_dict()})
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({
+                'engicalc': version(),
+                'python': platform.python_version(),
+                'seed': SEED,
+                'results': results,
+            }, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark: put_out() latency depending on the number of defined variables.
+
+Run with ``python benchmarks/bench_symbol_table.py``. The latency should stay
+flat from 10 to 10'000 variables since all symbol lookups are O(1).
+"""
+
+import timeit
+
+from IPython.core.interactiveshell import InteractiveShell
+
+import engicalc.output as output
+
+SIZES = [10, 100, 1_000, 10_000]
+REPEAT = 20
+
+CELL = """\
+alpha_u_A = np.sqrt(v_1) / 2
+M_apos = 2 * alpha_u_A + v_2 * v_3
+q_u_A = M_apos * l / (3 * EI_II)
+"""
+
+
+def setup_shell(n_variables):
+    shell = InteractiveShell.instance()
+    output.reset_expressions()
+    shell.run_cell("from engicalc import *\nimport numpy as np\nl = 1\nEI_II = 20", store_history=True)
+    for i in range(n_variables):
+        shell.user_ns[f"v_{i}"] = i
+        output.update_global_expressions(f"v_{i}", str(i), i)
+    shell.run_cell(CELL, store_history=True)
+    return shell
+
+
+def main():
+    # The Markdown output is not of interest here
+    output.display_markdown = lambda markdown_str: None
+    print(f"{'variables':>10} {'put_out [ms]':>14}")
+    for n in SIZES:
+        shell = setup_shell(n)
+        # put_out needs get_ipython(), which is only available inside a cell.
+        # Without storing the history, offset=1 refers to the captured cell.
+        run = lambda: shell.run_cell("put_out(symbolic=True, offset=1)", store_history=False)
+        seconds = min(timeit.repeat(run, number=1, repeat=REPEAT))
+        print(f"{n:>10} {seconds * 1e3:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
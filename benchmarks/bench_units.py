@@ -0,0 +1,63 @@
+"""
+Benchmark: unit labels and functions compiled with compile_units.
+
+Run with ``python benchmarks/bench_units.py``. The first part compares the
+LaTeX labels of pint units from the unit label table with formatting them with
+pint for every value, as before. The second part evaluates a load combination over
+arrays of increasing size with pint and compiled with compile_units.
+"""
+
+import timeit
+
+import numpy as np
+
+import engicalc.output as output
+import engicalc.units as un
+from engicalc.units import compile_units
+
+QUANTITIES = (3.5 * un.kN, 12.25 * un.kNm, 250 * un.MPa, 30 * un.mm, 45 * un.deg)
+SIZES = (10, 1000, 100000)
+
+
+def per_call(func, number):
+    return 1e6 * min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def labels():
+    def table():
+        for value in QUANTITIES:
+            output.unit_label(value.units)
+
+    def formatted():
+        # Formatting with pint for every value, as before the label table
+        for value in QUANTITIES:
+            output.format_unit(format(value.units, output.UNIT_FORMAT).replace('deg', '°'))
+
+    print(f"unit label, table:       {per_call(table, 2000) / len(QUANTITIES):8.1f} us per quantity")
+    print(f"unit label, pint format: {per_call(formatted, 2000) / len(QUANTITIES):8.1f} us per quantity")
+
+
+def combination(g_k, q_k, l, psi=0.7):
+    return (1.35 * g_k + 1.5 * psi * q_k) * l**2 / 8
+
+
+def sweep():
+    compiled = compile_units(combination)
+    g_k = 12 * un.kN / un.m
+    for size in SIZES:
+        q_k = np.linspace(0, 20, size) * un.kN / un.m
+        l = np.linspace(2, 12, size) * un.m
+        compiled(g_k, q_k, l)
+        number = max(10, 100000 // size)
+        pint = per_call(lambda: combination(g_k, q_k, l), number)
+        fast = per_call(lambda: compiled(g_k, q_k, l), number)
+        print(f"{size:>7} values: pint {pint:9.1f} us, compiled {fast:9.1f} us ({pint / fast:.1f}x)")
+
+
+def main():
+    labels()
+    sweep()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,21 @@
+import importlib
+
 from engicalc.output import *
+from engicalc.output import __all__ as _output_all
+
+# Submodules and names which are only loaded on first access, e.g. the unit
+# registry (pint) of engicalc.units
+_LAZY_MODULES = ('units',)
+_LAZY_ATTRIBUTES = {'ureg': 'units', 'compile_units': 'units'}
+
+# ureg is still exported by from engicalc import *, which loads pint
+__all__ = _output_all + ['ureg']
+
 
-import engicalc.units
\ No newline at end of file
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        return importlib.import_module(f'engicalc.{name}')
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f'engicalc.{_LAZY_ATTRIBUTES[name]}')
+        return getattr(module, name)
+    raise AttributeError(f"module 'engicalc' has no attribute '{name}'")
@@ -0,0 +1,93 @@
+"""
+Schnelle LaTeX-Ausgabe von NumPy-Arrays als Matrix.
+"""
+
+MATRIX = r"\left[\begin{matrix}%s\end{matrix}\right]"
+
+# Default limits, larger arrays are summarized with an ellipsis (None for
+# max_rows or max_cols turns the summary off along that axis)
+array_options = {
+    'max_rows': 50,
+    'max_cols': 20,
+    'edgeitems': 3,
+}
+
+
+def set_array_options(**options):
+    """Sets the summarization limits used for arrays (see array_options).
+
+    set_array_options(max_rows=None) prints all rows of an array.
+    """
+    for key, value in options.items():
+        if key not in array_options:
+            raise KeyError(f"Unknown array option '{key}'")
+        if value is None and key == 'edgeitems':
+            raise ValueError("edgeitems can not be None")
+        array_options[key] = None if value is None else int(value)
+
+
+def _summarize(array, axis, limit, edgeitems):
+    import numpy as np
+    # Keeps the first and last edgeitems along the axis if it is too long,
+    # like NumPy only if they do not overlap
+    if limit is None or array.shape[axis] <= max(limit, 2 * edgeitems):
+        return array, None
+    head = np.take(array, range(edgeitems), axis=axis)
+    tail = np.take(array, range(array.shape[axis] - edgeitems, array.shape[axis]), axis=axis)
+    return np.concatenate([head, tail], axis=axis), edgeitems
+
+
+def _format_floats(array):
+    import numpy as np
+    from sympy import Float, latex
+
+    # '%.15g' has the same digits and the same switch to the exponential
+    # notation as sympy's Float printing, only the spelling differs. Values
+    # with more than 15 significant digits may round the last digit
+    # differently and are left to sympy, like exponents, nan and inf.
+    text = np.char.mod('%.15g', array)
+    special = (np.char.find(text, 'e') >= 0) | (np.char.find(text, 'n') >= 0)
+    with np.errstate(invalid='ignore'):
+        special |= text.astype(float) != array
+    text = np.where(np.char.find(text, '.') < 0, np.char.add(text, '.0'), text)
+    text = np.where(text == '-0.0', '0.0', text)
+    text = text.astype(object)
+    for index in zip(*np.nonzero(special)):
+        text[index] = latex(Float(float(array[index])))
+    return text
+
+
+def array_latex(array, max_rows=None, max_cols=None, edgeitems=None):
+    """Formats a rounded 1D or 2D numeric array as LaTeX matrix.
+
+    1D arrays are printed as column vector, like sympy's Matrix. Returns None
+    for arrays which are not supported (other dtypes, empty, more than two
+    dimensions), these have to be printed by sympy.
+    """
+    import numpy as np
+
+    if array.ndim not in (1, 2) or array.size == 0 or array.dtype.kind not in 'iuf':
+        return None
+    max_rows = array_options['max_rows'] if max_rows is None else max_rows
+    max_cols = array_options['max_cols'] if max_cols is None else max_cols
+    edgeitems = array_options['edgeitems'] if edgeitems is None else edgeitems
+
+    if array.ndim == 1:
+        array = array[:, np.newaxis]
+    array, row_split = _summarize(array, 0, max_rows, edgeitems)
+    array, col_split = _summarize(array, 1, max_cols, edgeitems)
+
+    if array.dtype.kind == 'f':
+        text = _format_floats(array)
+    else:
+        text = np.char.mod('%d', array).astype(object)
+
+    if col_split is not None:
+        text = np.insert(text, col_split, r'\cdots', axis=1)
+    if row_split is not None:
+        dots = np.full(text.shape[1], r'\vdots', dtype=object)
+        if col_split is not None:
+            dots[col_split] = r'\ddots'
+        text = np.insert(text, row_split, dots, axis=0)
+
+    return MATRIX % r'\\'.join(' & '.join(row) for row in text.tolist())
@@ -0,0 +1,164 @@
+"""
+Rendert Notebooks ohne Jupyter-Frontend zu Markdown für Quarto.
+
+Usage::
+
+    python -m engicalc.batch calc/*.ipynb -o report/ -j 8
+
+Each notebook is executed in a fresh IPython shell. Markdown cells are copied
+and the output of every put_out() call is written to ``<notebook>.md`` as soon
+as its cell has run. The notebooks are distributed over a process pool.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+
+
+class NotebookError(Exception):
+    """Raised if a cell of a notebook fails during the batch run."""
+
+
+def _shell():
+    # One shell per process, the history is kept in memory only so that the
+    # workers do not compete for IPython's history database
+    from IPython.core.interactiveshell import InteractiveShell
+    from traitlets.config import Config
+
+    if not InteractiveShell.initialized():
+        config = Config()
+        config.HistoryManager.hist_file = ':memory:'
+        return InteractiveShell.instance(config=config)
+    shell = InteractiveShell.instance()
+    shell.reset(new_session=True)
+    return shell
+
+
+def read_cells(path) -> list:
+    """Returns the cells of a notebook as (cell_type, source) tuples."""
+    with open(path, encoding='utf-8') as file:
+        notebook = json.load(file)
+    cells = []
+    for cell in notebook.get('cells', []):
+        source = cell.get('source', '')
+        if isinstance(source, list):
+            source = ''.join(source)
+        cells.append((cell.get('cell_type'), source))
+    return cells
+
+
+def render_notebook(path, output_path=None, stats=False) -> dict:
+    """Executes a notebook and writes the put_out blocks to a Markdown file.
+
+    The output is written next to the notebook as ``<name>.md`` unless
+    output_path is given. Returns a summary with the keys 'notebook',
+    'output' and 'blocks', with stats=True also 'stats' (the RenderStats of
+    all put_out calls). Raises NotebookError if a cell fails.
+    """
+    from engicalc import output as engicalc_output
+
+    path = Path(path).resolve()
+    output_path = Path(output_path).resolve() if output_path else path.with_suffix('.md')
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    shell = _shell()
+    engicalc_output.reset_expressions()
+    renderer = engicalc_output.default_renderer
+    if stats:
+        renderer.enable_stats()
+    blocks = 0
+    cwd = os.getcwd()
+
+    with open(output_path, 'w', encoding='utf-8') as report:
+
+        def write_block(markdown_str):
+            nonlocal blocks
+            blocks += 1
+            report.write(markdown_str + '\n\n')
+
+        # Relative paths in the notebook refer to its folder
+        os.chdir(path.parent)
+        try:
+            with engicalc_output.redirect_markdown(write_block):
+                for number, (cell_type, source) in enumerate(read_cells(path), start=1):
+                    if cell_type == 'markdown':
+                        report.write(source.rstrip() + '\n\n')
+                    elif cell_type == 'code' and source.strip():
+                        # Printed output of the cells is not part of the report
+                        captured = io.StringIO()
+                        with redirect_stdout(captured), redirect_stderr(captured):
+                            result = shell.run_cell(source, store_history=True)
+                        if not result.success:
+                            error = result.error_in_exec or result.error_before_exec
+                            raise NotebookError(f"{path.name}, cell {number}: {error!r}")
+                    report.flush()
+        finally:
+            os.chdir(cwd)
+            notebook_stats = renderer.disable_stats()
+
+    summary = {'notebook': str(path), 'output': str(output_path), 'blocks': blocks}
+    if stats:
+        summary['stats'] = notebook_stats
+    return summary
+
+
+def render_notebooks(paths, output_dir=None, jobs=None, stats=False) -> list:
+    """Renders several notebooks in parallel, one process per notebook.
+
+    The Markdown files are written to output_dir (default: next to each
+    notebook). Returns the summaries of render_notebook, failed notebooks get
+    an 'error' entry instead of stopping the other ones.
+    """
+    paths = [Path(path) for path in paths]
+    targets = [Path(output_dir) / path.with_suffix('.md').name if output_dir else None for path in paths]
+
+    # The task is pickled by its module name. With python -m engicalc.batch it
+    # would be __main__.render_notebook, which the workers can not find once
+    # their IPython shell has replaced __main__.
+    from engicalc.batch import render_notebook as task
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(task, path, target, stats): path for path, target in zip(paths, targets)}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                results.append({'notebook': str(futures[future]), 'error': str(error)})
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m engicalc.batch',
+        description='Render the put_out output of Jupyter notebooks to Markdown files for Quarto.')
+    parser.add_argument('notebooks', nargs='+', help='.ipynb files to render')
+    parser.add_argument('-o', '--output-dir', help='folder for the .md files (default: next to the notebooks)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes (default: all cores)')
+    parser.add_argument('--stats', action='store_true', help='print the time spent per render stage')
+    args = parser.parse_args(argv)
+
+    from engicalc.stats import RenderStats
+
+    failed = 0
+    total = RenderStats()
+    for result in render_notebooks(args.notebooks, args.output_dir, args.jobs, args.stats):
+        if 'error' in result:
+            failed += 1
+            print(f"FAILED {result['notebook']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['output']} ({result['blocks']} blocks)")
+            if args.stats:
+                total.merge(result['stats'])
+    if args.stats:
+        print(total.report())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
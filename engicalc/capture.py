@@ -0,0 +1,154 @@
+"""
+Erfasst die Zuweisungen einer Zelle anhand des Python-AST.
+"""
+
+import ast
+import io
+import re
+import tokenize
+from functools import lru_cache
+
+# Number of parsed cells kept in memory
+PARSE_CACHE_SIZE = 256
+
+AUGMENTED_OPERATORS = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.MatMult: '@',
+    ast.Div: '/',
+    ast.FloorDiv: '//',
+    ast.Mod: '%',
+    ast.Pow: '**',
+}
+
+# Values which need no parentheses in an augmented assignment
+ATOMIC_NODES = (ast.Name, ast.Constant, ast.Attribute, ast.Subscript, ast.Call)
+
+# Statements whose bodies are not executed in the cell namespace
+SKIPPED_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+LINE_BREAK = re.compile(r'[ \t]*\\?[ \t]*\r?\n\s*')
+
+
+def cell_source(ipy, offset: int) -> str:
+    """Returns the (IPython-translated) source of the cell `offset` cells back."""
+    history = ipy.history_manager.input_hist_parsed
+    index = ipy.execution_count - offset
+    if 0 <= index < len(history):
+        return history[index]
+    return ''
+
+
+def _segment(source: str, node) -> str:
+    # Multi-line expressions are joined into one line, without their comments
+    segment = ast.get_source_segment(source, node)
+    if '\n' in segment:
+        segment = _strip_comments(segment)
+    return LINE_BREAK.sub(' ', segment).strip()
+
+
+def _strip_comments(segment: str) -> str:
+    lines = segment.splitlines(keepends=True)
+    try:
+        comments = [
+            token for token in tokenize.generate_tokens(io.StringIO(segment).readline)
+            if token.type == tokenize.COMMENT
+        ]
+    except (tokenize.TokenError, SyntaxError):
+        return segment
+    for token in comments:
+        (row, start), (_, end) = token.start, token.end
+        lines[row - 1] = lines[row - 1][:start] + lines[row - 1][end:]
+    return ''.join(lines)
+
+
+def _span(node) -> tuple:
+    return (node.lineno, node.col_offset, node.end_lineno, node.end_col_offset)
+
+
+def _names(node) -> tuple:
+    # Variables used in the expression (without attributes like un.mm)
+    return tuple(dict.fromkeys(
+        child.id for child in ast.walk(node) if isinstance(child, ast.Name)
+    ))
+
+
+def _record(kind, variable_name, expression, node, names=None) -> dict:
+    return {
+        'kind': kind,
+        'variable_name': variable_name,
+        'expression': expression,
+        'names': names,
+        'span': _span(node),
+    }
+
+
+def _assign_targets(source, target, value, records):
+    if isinstance(target, ast.Name):
+        records.append(_record('assign', target.id, _segment(source, value), value, _names(value)))
+    elif isinstance(target, (ast.Tuple, ast.List)):
+        # Unpacking: pair the targets with the elements of a literal tuple
+        if isinstance(value, (ast.Tuple, ast.List)) and len(value.elts) == len(target.elts):
+            for sub_target, sub_value in zip(target.elts, value.elts):
+                _assign_targets(source, sub_target, sub_value, records)
+        else:
+            # Otherwise only the values can be shown
+            for sub_target in target.elts:
+                if isinstance(sub_target, ast.Name):
+                    records.append(_record('assign', sub_target.id, sub_target.id, value, _names(value)))
+
+
+def _collect(source, statements, records):
+    for node in statements:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                _assign_targets(source, target, node.value, records)
+
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            _assign_targets(source, node.target, node.value, records)
+
+        elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            operator = AUGMENTED_OPERATORS.get(type(node.op))
+            if operator is None:
+                continue
+            value = _segment(source, node.value)
+            if not isinstance(node.value, ATOMIC_NODES):
+                value = f'({value})'
+            expression = f'{node.target.id} {operator} {value}'
+            names = (node.target.id,) + _names(node.value)
+            records.append(_record('assign', node.target.id, expression, node.value, names))
+
+        # A previously defined variable is recalled without an assignment
+        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Name):
+            records.append(_record('recall', node.value.id, None, node.value))
+
+        elif isinstance(node, SKIPPED_NODES):
+            continue
+
+        else:
+            # Assignments in the bodies of if, for, with, try, ...
+            for field in ('body', 'orelse', 'finalbody'):
+                _collect(source, getattr(node, field, []), records)
+            for handler in getattr(node, 'handlers', []):
+                _collect(source, handler.body, records)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_cell(source: str) -> tuple:
+    """Parses the source of a cell into assignment records.
+
+    Each record is a dict with the keys 'kind' ('assign' or 'recall'),
+    'variable_name', 'expression', 'names' (the variables used by the
+    assigned value, None for a recall) and 'span' (start line, start column,
+    end line, end column of the assigned value, or of the recalled name, in
+    the source). The results are cached
+    per source, so calling put_out repeatedly on the same cell parses it once.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return ()
+    records = []
+    _collect(source, tree.body, records)
+    return tuple(records)
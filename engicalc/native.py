@@ -0,0 +1,437 @@
+"""
+Direkte Umwandlung einfacher Python-Ausdrücke in LaTeX, ohne sympify.
+"""
+
+import ast
+import builtins
+import types
+from functools import lru_cache
+
+from engicalc.substitution import (
+    MODULE_PREFIXES, UNIT_MODULES, STRIPPED_ATTRIBUTES, RENAMES, convert_name,
+)
+
+# Upper bound for the cached symbol and number labels
+LABEL_CACHE_SIZE = 4096
+
+MUL = r" \cdot "
+
+# Functions which are rendered natively (name after the numpy substitution)
+TRIG_FUNCTIONS = ('sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh')
+FUNCTIONS = TRIG_FUNCTIONS + ('sqrt', 'exp', 'log', 'Abs')
+
+# The module prefixes, unit registries, stripped attributes and renamed
+# identifiers are the rules of engicalc.substitution, so that both paths
+# rewrite the same names
+
+
+class Unsupported(Exception):
+    """Raised for constructs which are left to the sympy path."""
+
+
+# Minimal model of the unevaluated sympy expression tree ------------------------
+
+class Sym:
+    def __init__(self, name):
+        self.name = name
+
+
+class Num:
+    def __init__(self, text, value):
+        self.text = text
+        self.value = value
+
+    @property
+    def negative(self):
+        return self.value < 0
+
+    def __neg__(self):
+        text = self.text[1:] if self.text.startswith('-') else '-' + self.text
+        return Num(text, -self.value)
+
+
+class Neg:
+    """Mul(-1, arg) as created by subtraction or a unary minus."""
+    def __init__(self, arg):
+        self.arg = arg
+
+
+class Add:
+    def __init__(self, args):
+        self.args = args
+
+
+class Mul:
+    def __init__(self, args):
+        self.args = args
+
+
+class Pow:
+    def __init__(self, base, exp):
+        self.base = base
+        self.exp = exp
+
+
+class Func:
+    def __init__(self, name, arg):
+        self.name = name
+        self.arg = arg
+
+
+ONE = Num('1', 1)
+MINUS_ONE = Num('-1', -1)
+HALF = object()
+
+
+@lru_cache(maxsize=1)
+def _sympy_names() -> frozenset:
+    # Names which sympify would not turn into a plain Symbol
+    import sympy
+    names = set(dir(sympy))
+    names.update(name for name, obj in vars(builtins).items() if isinstance(obj, types.BuiltinFunctionType))
+    return frozenset(names)
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def symbol_latex(name: str) -> str:
+    from sympy import Symbol, latex
+    return latex(Symbol(name))
+
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def float_latex(text: str) -> str:
+    from sympy import Float, latex
+    return latex(Float(text), mul_symbol='dot')
+
+
+# Python AST -> model ----------------------------------------------------------
+
+class Builder:
+    """Translates a Python expression into the model, following the way the
+    string substitutions and sympify(..., evaluate=False) would build it."""
+
+    def __init__(self, source, known):
+        self.source = source
+        self.known = known
+
+    def build(self, node):
+        method = getattr(self, 'build_' + type(node).__name__, None)
+        if method is None:
+            raise Unsupported(type(node).__name__)
+        return method(node)
+
+    def build_Expression(self, node):
+        return self.build(node.body)
+
+    def build_Name(self, node):
+        name = node.id
+        if name in self.known:
+            return Sym(convert_name(name))
+        if name in RENAMES or name in MODULE_PREFIXES or name in UNIT_MODULES:
+            raise Unsupported(name)
+        if name == 'pi':
+            return Sym(name)
+        converted = convert_name(name)
+        if converted != name:
+            # Names with conventions are plain symbols
+            return Sym(converted)
+        if name in _sympy_names():
+            raise Unsupported(name)
+        return Sym(name)
+
+    def build_Constant(self, node):
+        value = node.value
+        text = ast.get_source_segment(self.source, node)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or text is None:
+            raise Unsupported(repr(value))
+        if not text.replace('.', '').replace('e', '').replace('E', '').replace('-', '').replace('+', '').isdigit():
+            # Hex, underscores, ...
+            raise Unsupported(text)
+        return Num(text, value)
+
+    def build_UnaryOp(self, node):
+        if not isinstance(node.op, ast.USub):
+            raise Unsupported('unary operator')
+        if isinstance(node.operand, ast.Constant):
+            return -self.build(node.operand)
+        if isinstance(node.operand, ast.Name):
+            return Neg(self.build(node.operand))
+        raise Unsupported('unary minus')
+
+    def build_BinOp(self, node):
+        op = node.op
+        if is_unit(node.left):
+            raise Unsupported('leading unit')
+
+        if isinstance(op, (ast.Mult, ast.MatMult, ast.Div)):
+            # Strip unit factors, e.g. 30*un.mm
+            if is_unit(node.right):
+                return self.build(node.left)
+            left = self.build(node.left)
+            if isinstance(op, ast.Div):
+                if isinstance(node.left, ast.UnaryOp):
+                    raise Unsupported('negative numerator')
+                right = self.build(node.right)
+                if is_negative(right):
+                    raise Unsupported('negative denominator')
+                right = [Pow(right, MINUS_ONE)]
+            else:
+                right = flatten(self.build(node.right), Mul)
+            return Mul(flatten(left, Mul) + right)
+
+        if is_unit(node.right):
+            raise Unsupported('unit')
+
+        if isinstance(op, ast.Add):
+            return Add(flatten(self.build(node.left), Add) + flatten(self.build(node.right), Add))
+        if isinstance(op, ast.Sub):
+            return Add(flatten(self.build(node.left), Add) + [Neg(self.build(node.right))])
+        if isinstance(op, ast.Pow):
+            return Pow(self.build(node.left), self.build(node.right))
+        raise Unsupported(type(op).__name__)
+
+    def build_Call(self, node):
+        func = node.func
+        if node.keywords or len(node.args) != 1:
+            raise Unsupported('call signature')
+
+        # Unit conversions x.to(un.m) are dropped
+        if isinstance(func, ast.Attribute) and func.attr == 'to':
+            call = ast.get_source_segment(self.source, node)
+            value = ast.get_source_segment(self.source, func.value)
+            tail = call[len(value):] if call and value and call.startswith(value) else ''
+            if not tail.startswith('.to(') or tail.count(')') != 1 or not tail.endswith(')'):
+                raise Unsupported('unit conversion')
+            return self.build(func.value)
+
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id in MODULE_PREFIXES:
+            name = func.attr
+        elif isinstance(func, ast.Name):
+            name = func.id
+        else:
+            raise Unsupported('call')
+        if name in self.known:
+            raise Unsupported(name)
+        name = RENAMES.get(name, name)
+        if name not in FUNCTIONS:
+            raise Unsupported(name)
+
+        arg = self.build(node.args[0])
+        if name == 'sqrt':
+            return Pow(arg, HALF)
+        if name == 'exp' and is_negative(arg):
+            raise Unsupported('exp')
+        return Func(name, arg)
+
+    def build_Attribute(self, node):
+        value = node.value
+        if isinstance(value, ast.Name) and value.id in MODULE_PREFIXES and node.attr == 'pi':
+            return Sym('pi')
+        if node.attr not in STRIPPED_ATTRIBUTES or (isinstance(value, ast.Name) and (value.id in MODULE_PREFIXES or value.id in UNIT_MODULES)):
+            raise Unsupported(node.attr)
+        # Magnitude of a Pint quantity
+        return self.build(value)
+
+
+def is_unit(node) -> bool:
+    """Unit factors which engicalc.substitution removes."""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+        exponent = node.right
+        if not (isinstance(exponent, ast.Constant) and type(exponent.value) is int):
+            return False
+        node = node.left
+    return (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+            and node.value.id in UNIT_MODULES)
+
+
+def flatten(node, cls) -> list:
+    if isinstance(node, cls):
+        return list(node.args)
+    return [node]
+
+
+# Model -> LaTeX -----------------------------------------------------------------
+
+def is_negative(node) -> bool:
+    return isinstance(node, Neg) or (isinstance(node, Num) and node.negative)
+
+
+def needs_mul_brackets(node, first) -> bool:
+    if isinstance(node, Neg):
+        return not first
+    return isinstance(node, Add) or is_negative(node)
+
+
+def is_constant(node) -> bool:
+    """True if the sign of the node is known to sympy (no free symbols)."""
+    if isinstance(node, Sym):
+        return node.name == 'pi'
+    if isinstance(node, Num) or node is HALF:
+        return True
+    if isinstance(node, (Neg, Func)):
+        return is_constant(node.arg)
+    if isinstance(node, Pow):
+        return is_constant(node.base) and is_constant(node.exp)
+    return all(is_constant(arg) for arg in node.args)
+
+
+def needs_pow_brackets(node) -> bool:
+    return isinstance(node, (Add, Mul, Pow, Neg)) or (isinstance(node, Num) and node.negative)
+
+
+def print_latex(node) -> str:
+    if isinstance(node, Sym):
+        return symbol_latex(node.name)
+    if isinstance(node, Num):
+        if isinstance(node.value, int):
+            return str(node.value)
+        return float_latex(node.text)
+    if isinstance(node, Neg):
+        if not isinstance(node.arg, Sym):
+            raise Unsupported('negation')
+        return '- ' + print_latex(node.arg)
+    if isinstance(node, Add):
+        return print_add(node)
+    if isinstance(node, Mul):
+        return print_mul(node)
+    if isinstance(node, Pow):
+        return print_pow(node)
+    if isinstance(node, Func):
+        return print_function(node)
+    raise Unsupported(type(node).__name__)
+
+
+def print_add(node) -> str:
+    tex = ''
+    for i, term in enumerate(node.args):
+        if i == 0:
+            tex += print_latex(term)
+        elif isinstance(term, Neg):
+            arg = term.arg
+            if is_negative(arg) or (isinstance(arg, Mul) and is_negative(arg.args[0])):
+                raise Unsupported('double negation')
+            term_tex = print_latex(arg)
+            if isinstance(arg, Add):
+                term_tex = r'\left(%s\right)' % term_tex
+            tex += ' - ' + term_tex
+        elif isinstance(term, Num) and term.negative:
+            tex += ' - ' + print_latex(-term)
+        else:
+            tex += ' + ' + print_latex(term)
+    return tex
+
+
+def convert(node) -> str:
+    if isinstance(node, Mul):
+        return convert_args(node.args)
+    return print_latex(node)
+
+
+def convert_args(args) -> str:
+    parts = []
+    for i, term in enumerate(args):
+        term_tex = print_latex(term)
+        if needs_mul_brackets(term, first=(i == 0)):
+            term_tex = r'\left(%s\right)' % term_tex
+        parts.append(term_tex)
+    return MUL.join(parts)
+
+
+def make_mul(args):
+    if not args:
+        return ONE
+    if len(args) == 1:
+        return args[0]
+    return Mul(args)
+
+
+def fraction(args):
+    """Splits factors into numerator and denominator (sympy's fraction(exact=True))."""
+    numer, denom = [], []
+    for term in args:
+        if isinstance(term, Pow) and not isinstance(term.exp, Num) and term.exp is not HALF \
+                and is_constant(term.exp):
+            # sympy would move powers with a negative exponent to the denominator
+            raise Unsupported('constant exponent')
+        if isinstance(term, Pow) and isinstance(term.exp, Num) and term.exp.negative:
+            if isinstance(term.exp.value, int) and term.exp.value == -1:
+                denom.append(term.base)
+            elif isinstance(term.base, (Sym, Func, Add)):
+                denom.append(Pow(term.base, -term.exp))
+            else:
+                # sympy evaluates this power, e.g. sqrt(x)**2 -> x
+                raise Unsupported('negative exponent')
+        else:
+            numer.append(term)
+    return make_mul(numer), make_mul(denom), bool(denom)
+
+
+def print_mul(node) -> str:
+    args = node.args
+    if any(isinstance(arg, Neg) for arg in args) or is_negative(args[0]):
+        raise Unsupported('negative factor')
+
+    # Unevaluated products with numbers are printed as they are
+    first = args[0]
+    if (isinstance(first, Num) and isinstance(first.value, int) and first.value == 1) \
+            or any(isinstance(arg, Num) for arg in args[1:]):
+        return convert_args(args)
+
+    numer, denom, has_denom = fraction(args)
+    if not has_denom:
+        return convert_args(args)
+    return r'\frac{%s}{%s}' % (convert(numer), convert(denom))
+
+
+def print_pow(node) -> str:
+    base, exp = node.base, node.exp
+    if exp is HALF:
+        return r'\sqrt{%s}' % print_latex(base)
+    if isinstance(base, Neg) and isinstance(exp, Num) and exp.negative:
+        raise Unsupported('negative base')
+
+    # Negative integer exponents are printed as fraction
+    if isinstance(exp, Num) and isinstance(exp.value, int) and exp.negative:
+        if isinstance(base, Num) and base.value == 1:
+            raise Unsupported('power of one')
+        _, denom, _ = fraction([node])
+        return r'\frac{1}{%s}' % convert(denom)
+
+    exp_tex = print_latex(exp)
+    if isinstance(base, Func):
+        if base.name in TRIG_FUNCTIONS:
+            return r'\%s^{%s}{\left(%s \right)}' % (base.name, exp_tex, print_latex(base.arg))
+        if base.name == 'exp':
+            return r'\left(%s\right)^{%s}' % (print_latex(base), exp_tex)
+        return '%s^{%s}' % (print_latex(base), exp_tex)
+
+    base_tex = print_latex(base)
+    if needs_pow_brackets(base) or (isinstance(base, Sym) and '^' in base_tex):
+        base_tex = r'\left(%s\right)' % base_tex
+    if isinstance(base, Num) and isinstance(base.value, float):
+        base_tex = '{%s}' % base_tex
+    return '%s^{%s}' % (base_tex, exp_tex)
+
+
+def print_function(node) -> str:
+    arg_tex = print_latex(node.arg)
+    if node.name == 'Abs':
+        return r'\left|{%s}\right|' % arg_tex
+    if node.name == 'exp':
+        return 'e^{%s}' % arg_tex
+    return r'\%s{\left(%s \right)}' % (node.name, arg_tex)
+
+
+def render_native(expr: str, known=()) -> str:
+    """Renders a Python expression as LaTeX without sympify.
+
+    `known` are the variable names in global_expressions. Returns None for
+    constructs which are not supported natively, these have to be rendered by
+    sympy. The output matches latex(sympify(..., evaluate=False)) as used by
+    format_symbolic.
+    """
+    try:
+        tree = ast.parse(expr.strip(), mode='eval')
+        return print_latex(Builder(expr.strip(), frozenset(known)).build(tree))
+    except (Unsupported, SyntaxError, RecursionError):
+        return None
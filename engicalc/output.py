@@ -1,89 +1,133 @@
-import io
-from contextlib import redirect_stdout
-from sympy import sympify, latex, SympifyError, Symbol, Matrix
-import numpy as np
-from IPython.display import display, Markdown
+# sympy, numpy, pint and IPython are imported on first use in the render path,
+# so that importing engicalc stays fast
 import re
-from engicalc.units import ureg
-
-global_expressions = []
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from engicalc.symbols import SymbolTable
+from engicalc.capture import cell_source, parse_cell
+from engicalc.native import render_native
+from engicalc.substitution import substitute, rules_version
+from engicalc.arrays import array_latex, array_options, set_array_options
+from engicalc.stats import RenderStats, collect as collect_stats, timer as stage_timer, count as count_event
+
+# Names exported by from engicalc import *
+__all__ = [
+    'put_out',
+    'put_out_async',
+    'Renderer',
+    'default_renderer',
+    'recompute',
+    'downstream',
+    'enable_render_stats',
+    'disable_render_stats',
+    'render_stats',
+    'render_cache_info',
+    'clear_render_cache',
+    'reset_expressions',
+    'redirect_markdown',
+    'set_array_options',
+    'global_expressions',
+    'update_global_expressions',
+    'cell_parser',
+    'format_value',
+    'format_symbolic',
+    'build_equation',
+]
+
+global_expressions = SymbolTable()
+
+# Upper bounds for the LaTeX render caches
+SYMBOLIC_CACHE_SIZE = 4096
+UNIT_CACHE_SIZE = 256
+
+# (pint units, unit format) -> LaTeX label, see unit_label()
+_unit_labels = {}
+
+# Receiver of the Markdown output, if not displayed in the notebook
+_markdown_sink = None
+
+# Unit format used for Pint quantities in the equations
+UNIT_FORMAT = "~L"
+
+# Default options of put_out and Renderer
+RENDER_OPTIONS = {
+    'precision': 2,
+    'symbolic': False,
+    'evaluate': False,
+    'numeric': True,
+    'rows': 3,
+    'style': None,
+    # Rows per aligned block, None for a single block
+    'block_rows': None,
+    # Emit every block as soon as its equations are rendered
+    'stream': False,
+    # Markdown file the blocks are appended to instead of the notebook
+    'report': None,
+}
+
+# Worker of put_out_async, created on first use
+_executor = None
+
+IDENTIFIER = re.compile(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b')
 
 # Function to update or append the variable to global_expressions
 def update_global_expressions(variable_name, expression, result):
-    for entry in global_expressions:
-        if entry['variable_name'] == variable_name:
-            # Update existing entry with the new expression and result
-            entry['expression'] = expression
-            entry['result'] = result
-            return
-    # If variable_name is not found, append a new entry
-    global_expressions.append({
-        'variable_name': variable_name,
-        'expression': expression,
-        'result': result
-    })
+    global_expressions.update(variable_name, expression, result)
 
-def cell_parser(offset: int) -> dict:
+def reset_expressions():
+    """Forgets all previously captured variables (e.g. for a new notebook)."""
+    global_expressions.reset()
 
-    ipy = get_ipython()
-    out = io.StringIO()
+def cell_parser(offset: int, expressions: SymbolTable = None, ipy=None) -> dict:
 
-    # Capture the history of executed commands
-    with redirect_stdout(out):
-        ipy.run_line_magic("history", f"{ipy.execution_count - offset}")
+    if expressions is None:
+        expressions = global_expressions
+    if ipy is None:
+        ipy = get_ipython()
+
+    # Parse the source of the cell (cached per cell source)
+    records = parse_cell(cell_source(ipy, offset))
 
     # Get the current variables and their values from the user namespace
     user_ns = ipy.user_ns
-
-    # Extract variable names and expressions from the captured output
-    lines = out.getvalue().replace(" ", "").split("\n")
     cell_variables = []
 
-    for line in lines:
-        # When a new variable is defined (with an assignment):
-        if "=" in line:
-            variable_name, expression = line.split('=', 1)
-
-            if variable_name in user_ns:
-                result = user_ns[variable_name]
-                cell_variables.append({
-                    'variable_name': variable_name,
-                    'expression': expression,
-                    'result': result
-                })
+    for record in records:
+        variable_name = record['variable_name']
+        if variable_name not in user_ns:
+            continue
+        result = user_ns[variable_name]
 
-                # Update or add the variable to global_expressions
-                update_global_expressions(variable_name, expression, result)
+        # When a new variable is defined (with an assignment):
+        if record['kind'] == 'assign':
+            expression = record['expression']
 
         # When capturing a previously defined variable without an assignment:
-        elif line in user_ns:
-            variable_name = line
-            result = user_ns[variable_name]
-            
-            # Search for the matching entry in global_expressions
-            expression = variable_name  # Default to the variable name as the expression
-            for entry in global_expressions:
-                if entry['variable_name'] == variable_name:
-                    expression = entry['expression']
-                    break
-
-            # Add to cell_variables and update global_expressions
-            cell_variables.append({
-                'variable_name': variable_name,
-                'expression': expression,
-                'result': result
-            })
-
-            # Update or add the variable to global_expressions
-            update_global_expressions(variable_name, expression, result)
-
+        else:
+            # Look up the stored expression, default to the variable name
+            expression = expressions.expression(variable_name, variable_name)
+
+        # Update or add the variable to the symbol table, the variables used
+        # by the expression are its dependencies
+        changed = expressions.update(variable_name, expression, result, record.get('names'))
+
+        cell_variables.append({
+            'variable_name': variable_name,
+            'expression': expression,
+            'result': result,
+            'span': record['span'],
+            'revision': expressions[variable_name]['revision'],
+            'changed': changed
+        })
 
     return cell_variables
 
-def format_value(value, precision: float):
+def format_value(value, precision: float, unit_format: str = UNIT_FORMAT):
     """Formats the value based on its type."""
-    # change the unit format to latex
-    ureg.formatter.default_format = "~L"
+    import numpy as np
 
     if isinstance(value, (int, float)):
         return round(value, precision)
@@ -91,137 +135,171 @@ def format_value(value, precision: float):
     elif isinstance(value, np.ndarray):
         # Handle numpy arrays as matrices
         rounded_value = np.round(value, precision)
-        matrix = Matrix(rounded_value.tolist())
-        return latex(matrix)
+        return format_array(rounded_value)
     
     elif isinstance(value, list):
-        # Handle lists as vectors
-        formatted_list = [format_value(item, precision) for item in value]
+        # Handle lists as vectors, numeric (nested) lists are rounded at once
+        rounded_list = round_list(value, precision)
+        if rounded_list is not None:
+            return rounded_list
+        formatted_list = [format_value(item, precision, unit_format) for item in value]
         return formatted_list
     
     elif hasattr(value, "magnitude"):
 
-        # replace the degree sign
-        units = str(value.units)
-        units = units.replace('deg','°')
+        # LaTeX label of the units, looked up in the unit label table
+        units = unit_label(value.units, unit_format)
 
         # Handle Pint quantities
         magnitude = np.round(value.magnitude, precision)
         if isinstance(magnitude, np.ndarray):
             # Handle numpy arrays of Pint quantities as matrices
-            return f"{latex(Matrix(magnitude.tolist()))} \\ {latex(Symbol(units))}"
+            return f"{format_array(magnitude)} \\ {units}"
         else:
             # Handle scalar Pint quantities
-            return f"{magnitude} \\ {latex(Symbol(units))}"
+            return f"{magnitude} \\ {units}"
     else:
         return value
 
-def format_symbolic(expr: str, evaluate: bool) -> str:
-    """Formats the symbolic expression using sympy."""
+def format_array(rounded_value) -> str:
+    """Formats a rounded array as matrix, summarized if it is large."""
+    tex = array_latex(rounded_value)
+    if tex is None:
+        from sympy import latex, Matrix
+        tex = latex(Matrix(rounded_value.tolist()))
+    return tex
+
+def round_list(value: list, precision: float):
+    """Rounds a (nested) list of only ints and floats in one pass.
+
+    Floats are rounded with Python's round, like scalars, so the result does
+    not depend on the type of the value. Returns None for lists with other
+    items (arrays, quantities, ...), these are formatted item by item.
+    """
+    integers = True
+    pending = [value]
+    while pending:
+        for item in pending.pop():
+            if type(item) is list:
+                pending.append(item)
+            elif type(item) is float:
+                integers = False
+            elif type(item) is not int:
+                return None
+    if integers:
+        return value
+    return _round_nested(value, precision)
+
+def _round_nested(value: list, precision: float) -> list:
+    return [
+        _round_nested(item, precision) if isinstance(item, list) else round(item, precision)
+        for item in value
+    ]
+
+@lru_cache(maxsize=UNIT_CACHE_SIZE)
+def format_unit(units: str) -> str:
+    """Renders a unit label as LaTeX."""
+    from sympy import latex, Symbol
+    return latex(Symbol(units))
+
+def unit_label(units, unit_format: str = UNIT_FORMAT) -> str:
+    """Returns the LaTeX label of pint units, e.g. kN·m -> \\mathrm{kN} \\cdot \\mathrm{m}.
+
+    The labels are kept in a table. It starts with the units defined in
+    engicalc.units and is extended by every other unit when it first appears,
+    so pint and sympy format each unit only once.
+    """
+    key = (units, unit_format)
+    label = _unit_labels.get(key)
+    if label is None:
+        if not _unit_labels:
+            _precompute_unit_labels(unit_format)
+        label = _unit_labels[key] = _format_label(units, unit_format)
+    return label
+
+def _format_label(units, unit_format: str) -> str:
+    # format the units as latex (without touching the registry default)
+    # and replace the degree sign
+    return format_unit(format(units, unit_format).replace('deg', '°'))
+
+def _precompute_unit_labels(unit_format: str):
+    # Labels of the units of engicalc.units, if they were imported
+    module = sys.modules.get('engicalc.units')
+    if module is None:
+        return
+    unit_type = type(module.ureg.m)
+    for value in vars(module).values():
+        if isinstance(value, unit_type):
+            _unit_labels[(value, unit_format)] = _format_label(value, unit_format)
+
+def format_symbolic(expr: str, evaluate: bool, symbols=None) -> str:
+    """Formats the symbolic expression using sympy.
+
+    symbols are the known variable names (default: global_expressions), only
+    those are rendered as plain symbols. The rendered LaTeX is cached, besides
+    the expression and `evaluate` the key contains the identifiers of the
+    expression which are known and the version of the substitution rules.
+    """
+    with stage_timer('symbolic'):
+        count_event('symbolic_calls')
+        if symbols is None:
+            symbols = global_expressions
+        known = tuple(name for name in IDENTIFIER.findall(expr) if name in symbols)
+        return _format_symbolic(expr, evaluate, known, rules_version())
+
+@lru_cache(maxsize=SYMBOLIC_CACHE_SIZE)
+def _format_symbolic(expr: str, evaluate: bool, known: tuple, rules: int) -> str:
+    # Only reached on a cache miss
+    count_event('symbolic_cache_misses')
+    # Common expressions are rendered directly from the Python AST
+    if not evaluate:
+        with stage_timer('symbolic.native'):
+            native = render_native(expr, known)
+        if native is not None:
+            count_event('native')
+            return native
+    count_event('sympy')
+    return format_sympy(expr, evaluate, known)
+
+def format_sympy(expr: str, evaluate: bool, symbols=None) -> str:
+    """Formats the expression with the substitution rules, sympify and latex."""
+    from sympy import sympify, latex, SympifyError
+    if symbols is None:
+        symbols = global_expressions
     try:
-        # do the package substitution
-        expr = substitute_numpy(expr)
-        expr = substitute_math(expr)
-        expr = substitute_pint(expr)
-        expr = substitute_engicalc(expr)
-        expr = substitute_special_characters(expr)
-        symbolic_expr = sympify(expr, evaluate=evaluate)
-        return latex(symbolic_expr, mul_symbol = 'dot', order='none')
+        # do the package substitution (see engicalc.substitution)
+        with stage_timer('symbolic.substitute'):
+            expr = substitute(expr, symbols)
+        with stage_timer('symbolic.sympify'):
+            symbolic_expr = sympify(expr, evaluate=evaluate)
+        with stage_timer('symbolic.latex'):
+            return latex(symbolic_expr, mul_symbol = 'dot', order='none')
     except (SympifyError, TypeError, ValueError):
+        count_event('sympy_errors')
         return expr
 
-def substitute_numpy(expr: str) -> str:
-    replacements = {
-        'np.': '', 
-        'array': 'Matrix',
-        '@': '*',
-        'abs': 'Abs', #in sympy absolute value is defined with Abs
-    }
-    for key, value in replacements.items():
-        expr = expr.replace(key, value)
-    return expr
-
-def substitute_math(expr: str) -> str:
-    replacements = {
-        'math.': '', 
-    }
-    for key, value in replacements.items():
-        expr = expr.replace(key, value)
-    return expr
-
-def substitute_pint(expr: str) -> str:
-    replacements = {
-        '.m': '',
-        '.magnitude': '',
-        '.deg':'test'
-    }
-
-    # Replace unit registry and unit conversions with a space
-    expr = re.sub(r'\.to\([^\)]+\)', '', expr)  # Remove unit conversions
-    expr = re.sub(r'[\*/]?\s*un\.\w+(\*\*\d+)?', '', expr)
-    expr = re.sub(r'[\*/]?\s*ureg\.\w+(\*\*\d+)?', '', expr)
-
-    # Apply other replacements
-    for key, value in replacements.items():
-        expr = expr.replace(key, value)
-    
-    return expr
-
-def substitute_special_characters(expr: str) -> str:
-    replacements = {
-        'com': ',',
-        'diam': r'\\oslash',
-        '_apos':"prime",
-        'eps':'varepsilon', #convenience
-        'infty': r'\\infty',
-
-    }
-
-
-    # Function to wrap all variable names in sympy.Symbol()
-    def replace_variables(match):
-        var_name = match.group(0)
-
-        # Check if the var_name matches any variable_name in global_expressions
-        for entry in global_expressions:
-            if var_name == entry['variable_name']:
-                # Return a sympy-compatible symbol expression
-                return f'Symbol("{var_name}")'
-
-        # If var_name is not found in global_expressions, return it as-is
-        return var_name
-
-        
-    # Use regex to find all valid variable names (e.g., alphanumeric and underscores)
-    # Modify this regex if you have specific naming conventions
-    expr = re.sub(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', replace_variables, expr)
-
-    # Apply other replacements
-    for key, value in replacements.items():
-        expr = expr.replace(key, value)
-    
-    return expr
-
-def substitute_engicalc(expr: str) -> str:
-    replacements = {
-
+def render_cache_info() -> dict:
+    """Returns the hit/miss statistics of the LaTeX render caches."""
+    return {
+        'symbolic': _format_symbolic.cache_info(),
+        'units': format_unit.cache_info(),
+        'unit_labels': len(_unit_labels),
     }
 
-    # Replace unit registry and unit conversions with a space
-    expr = re.sub(r'ecc.', '', expr)
-    expr = re.sub(r'Beton.', '', expr)
+def clear_render_cache():
+    """Empties the LaTeX render caches."""
+    _format_symbolic.cache_clear()
+    format_unit.cache_clear()
+    _unit_labels.clear()
+    default_renderer.clear_cache()
 
-    # Apply other replacements
-    for key, value in replacements.items():
-        expr = expr.replace(key, value)
-    
-    return expr
-
-def build_equation(assignment: dict, precision: float, symbolic: bool, numeric: bool, evaluate: bool):
+def build_equation(assignment: dict, precision: float, symbolic: bool, numeric: bool, evaluate: bool, symbols=None, unit_format: str = UNIT_FORMAT):
+    count_event('equations')
     try:
-        var = format_symbolic(assignment['variable_name'], evaluate=evaluate)
-        expression = format_symbolic(assignment['expression'], evaluate=evaluate)
-        result = format_value(assignment['result'], precision=precision)
+        var = format_symbolic(assignment['variable_name'], evaluate=evaluate, symbols=symbols)
+        expression = format_symbolic(assignment['expression'], evaluate=evaluate, symbols=symbols)
+        with stage_timer('format_value'):
+            result = format_value(assignment['result'], precision=precision, unit_format=unit_format)
 
         if var == expression:
             equation = f'{var}& = {result}'
@@ -240,27 +318,23 @@ def build_equation(assignment: dict, precision: float, symbolic: bool, numeric:
                 if numeric == True and symbolic == True:
                     equation = f'{var}& = {expression} = {result}'
     except:
-        var = format_symbolic(assignment['variable_name'], evaluate=evaluate)
-        result = format_value(assignment['result'], precision=precision)
+        count_event('equation_errors')
+        var = format_symbolic(assignment['variable_name'], evaluate=evaluate, symbols=symbols)
+        with stage_timer('format_value'):
+            result = format_value(assignment['result'], precision=precision, unit_format=unit_format)
         equation = f'{var}& = {result}'
 
     return equation
 
-def put_out(precision: float = 2, symbolic: bool = False, evaluate: bool = False, numeric: bool = True, offset: int = 0, rows: int = 3, style=None, debug=False):
-    """Constructs and displays the final Markdown output."""
-    parsed_lines = cell_parser(offset)
-    equations = [build_equation(assignment = eq, symbolic=symbolic, numeric = numeric,  precision=precision, evaluate=evaluate) for eq in parsed_lines]
+def build_markdown(equations: list, rows: int = 3, columns: int = None) -> str:
+    """Aligns the equations in rows of `rows` columns.
+
+    With fewer equations than `rows` the columns are reduced, unless the
+    number of columns is given (for the later blocks of a blocked output).
+    """
     # dropping duplicates by creating a dict
     equations = list(dict.fromkeys(equations))
-
-    # if debug:
-    #     for equation in equations:
-    #         print(equation.replace('&', ''))
-    # 
-    rows = min(rows,len(equations))
-
-
-    # changes the unit format to latex
+    rows = min(rows,len(equations)) if columns is None else columns
 
     markdown_str = "$$\\begin{aligned}"
     for i in range(0, len(equations), rows):
@@ -277,23 +351,378 @@ def put_out(precision: float = 2, symbolic: bool = False, evaluate: bool = False
             markdown_str += " \\\\ "
 
     markdown_str += "\\end{aligned}$$"
+    return markdown_str
+
+def style_markdown(markdown_str: str, style=None) -> str:
+    """Wraps the Markdown in a custom style div for Quarto."""
+    if style is None:
+        return markdown_str
+    return f"::: {{custom-style=\"{style}\"}}\n{markdown_str}\n:::"
+
+@contextmanager
+def redirect_markdown(sink):
+    """Sends the Markdown of put_out to sink (a callable) instead of the notebook."""
+    global _markdown_sink
+    previous, _markdown_sink = _markdown_sink, sink
+    try:
+        yield sink
+    finally:
+        _markdown_sink = previous
+
+def display_markdown(markdown_str: str):
+    """Displays the Markdown string in the notebook."""
+    if _markdown_sink is not None:
+        _markdown_sink(markdown_str)
+        return
+    from IPython.display import display, Markdown
+    display(Markdown(markdown_str))
+
+def _render_executor() -> ThreadPoolExecutor:
+    # A single worker keeps the outputs in the order of the cells and never
+    # runs sympy concurrently
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='engicalc-render')
+    return _executor
+
+class Renderer:
+    """Renders the assignments of notebook cells as aligned equations.
+
+    A renderer owns its symbol table, its default options (see
+    RENDER_OPTIONS) and its unit format, nothing is changed on the module or
+    the unit registry. Several renderers can therefore be used side by side
+    or from different threads. put_out() uses a default instance which shares
+    global_expressions.
+
+    After enable_stats() every put_out call records the time per stage in
+    last_stats (a RenderStats), stats holds the sum over all calls.
+
+    The equations are kept per variable and reused as long as its entry in
+    the symbol table (expression, result and dependencies) is unchanged, so
+    re-running a sheet only renders what changed. recompute() updates the
+    variables depending on a changed input without re-running the cells.
+
+    Usage:
+        report = Renderer(precision=3, rows=2)
+        report.put_out()
+    """
+
+    def __init__(self, expressions: SymbolTable = None, unit_format: str = UNIT_FORMAT, sink=None, **options):
+        for key in options:
+            if key not in RENDER_OPTIONS:
+                raise KeyError(f"Unknown render option '{key}'")
+        self.expressions = SymbolTable() if expressions is None else expressions
+        self.options = {**RENDER_OPTIONS, **options}
+        self.unit_format = unit_format
+        # Callable receiving the Markdown, by default it is displayed
+        self.sink = sink
+        # Timing statistics, only collected after enable_stats()
+        self.stats = None
+        self.last_stats = None
+        self._stats_lock = threading.Lock()
+        # variable name -> (key, equation) of the last rendering
+        self._equations = {}
+
+    def _options(self, overrides: dict) -> dict:
+        options = dict(self.options)
+        for key, value in overrides.items():
+            if key not in RENDER_OPTIONS:
+                raise KeyError(f"Unknown render option '{key}'")
+            options[key] = value
+        return options
+
+    def reset(self):
+        """Forgets all previously captured variables."""
+        self.expressions.reset()
+        self._equations.clear()
+
+    def clear_cache(self):
+        """Forgets the rendered equations."""
+        self._equations.clear()
+
+    def enable_stats(self, stats: RenderStats = None) -> RenderStats:
+        """Starts collecting timing statistics of put_out (into stats)."""
+        self.stats = RenderStats() if stats is None else stats
+        return self.stats
+
+    def disable_stats(self) -> RenderStats:
+        """Stops collecting statistics and returns the collected ones."""
+        stats, self.stats = self.stats, None
+        return stats
+
+    def _call_stats(self):
+        # Statistics of a single put_out call, None if not collecting
+        if self.stats is None:
+            return None
+        call_stats = RenderStats()
+        call_stats.count('cells')
+        return call_stats
+
+    def _add_stats(self, call_stats):
+        if call_stats is None or self.stats is None:
+            return
+        with self._stats_lock:
+            self.stats.merge(call_stats)
+            self.last_stats = call_stats
+
+    def capture(self, offset: int = 0, ipy=None) -> list:
+        """Captures the assignments of the current cell into the symbol table."""
+        with stage_timer('capture'):
+            return cell_parser(offset, self.expressions, ipy)
+
+    def render(self, assignments: list, symbols=None, **options) -> str:
+        """Returns the Markdown of the captured assignments."""
+        return '\n\n'.join(self.blocks(assignments, symbols, **options))
+
+    def blocks(self, assignments: list, symbols=None, **options):
+        """Yields the Markdown of the assignments in aligned blocks.
+
+        Each block holds at most block_rows rows of `rows` equations and is
+        yielded as soon as its equations are rendered. Without block_rows
+        there is a single block.
+        """
+        options = self._options(options)
+        if symbols is None:
+            symbols = self.expressions
+        settings = (options['precision'], options['symbolic'], options['numeric'], options['evaluate'],
+                    self.unit_format, rules_version())
+        block_size = None
+        if options['block_rows'] is not None:
+            block_size = max(1, options['block_rows'] * options['rows'])
+
+        # dropping duplicates while rendering, also across the blocks
+        seen = set()
+        equations = []
+        columns = None
+        for eq in assignments:
+            equation = self.equation(eq, symbols, settings)
+            if equation in seen:
+                continue
+            seen.add(equation)
+            equations.append(equation)
+            if block_size is not None and len(equations) == block_size:
+                yield self._block(equations, options, columns)
+                # The later blocks keep the columns of the first one
+                equations = []
+                columns = options['rows']
+        if equations or block_size is None:
+            yield self._block(equations, options, columns)
+
+    def _block(self, equations: list, options: dict, columns: int = None) -> str:
+        with stage_timer('markdown'):
+            markdown_str = build_markdown(equations, options['rows'], columns)
+            return style_markdown(markdown_str, options['style'])
+
+    def equation(self, assignment: dict, symbols, settings: tuple) -> str:
+        """Returns the equation of an assignment, reused if it is unchanged."""
+        name = assignment['variable_name']
+        revision = assignment.get('revision')
+        if revision is not None:
+            # The known variables decide which names are plain symbols
+            expression = assignment['expression'] or ''
+            known = tuple(word for word in IDENTIFIER.findall(expression) if word in symbols)
+            key = (revision, known, name in symbols) + settings
+            cached = self._equations.get(name)
+            if cached is not None and cached[0] == key:
+                count_event('equations_reused')
+                return cached[1]
+
+        precision, symbolic, numeric, evaluate, unit_format, _ = settings
+        equation = build_equation(
+            assignment=assignment,
+            precision=precision,
+            symbolic=symbolic,
+            numeric=numeric,
+            evaluate=evaluate,
+            symbols=symbols,
+            unit_format=unit_format,
+        )
+        if revision is not None:
+            self._equations[name] = (key, equation)
+        return equation
+
+    def downstream(self, *variable_names) -> list:
+        """Returns the variables depending on the given ones, in topological order.
+
+        Raises KeyError for variables which are not in the symbol table.
+        """
+        return self.expressions.downstream(*variable_names)
+
+    def recompute(self, *variable_names, ipy=None, show=False, **options) -> list:
+        """Recomputes the variables depending on the changed ones.
+
+        The stored expressions of the downstream variables are evaluated in
+        topological order in the notebook namespace, only the affected part of
+        the sheet is visited. With show=True the updated equations are
+        displayed. Returns the names of the recomputed variables.
+
+        The results are only stored when all expressions could be evaluated.
+        Raises ValueError if an expression fails or uses the variable itself
+        (e.g. x += 1), as evaluating it again would give a different result,
+        and KeyError for variables which are not in the symbol table.
+        """
+        if ipy is None:
+            ipy = get_ipython()
+        user_ns = ipy.user_ns
+        order = self.expressions.downstream(*variable_names)
+
+        repeated = [name for name in order if name in IDENTIFIER.findall(self.expressions.expression(name) or '')]
+        if repeated:
+            raise ValueError(f"Cannot recompute {', '.join(repeated)}, the expression uses the variable itself")
+
+        # Evaluated in a copy of the namespace, nothing is changed if one of
+        # the expressions fails
+        namespace = dict(user_ns)
+        results = {}
+        for name in order:
+            try:
+                results[name] = namespace[name] = eval(self.expressions.expression(name), namespace)
+            except Exception as error:
+                raise ValueError(f"Cannot recompute {name}, no variable was updated: {error!r}") from error
+
+        assignments = []
+        for name, result in results.items():
+            entry = self.expressions[name]
+            user_ns[name] = result
+            self.expressions.update(name, entry['expression'], result)
+            assignments.append({
+                'variable_name': name,
+                'expression': entry['expression'],
+                'result': result,
+                'revision': entry['revision'],
+            })
 
-    ## Adding the color
-
-
-    colored_markdown_str = f"[{markdown_str}]{{custom-style=\"{style};\"}}"
-
-    if style!=None:
-        colored_markdown_str = f"::: {{custom-style=\"{style}\"}}\n{markdown_str}\n:::"
-        display(Markdown(colored_markdown_str))
-        if debug:
-            print(markdown_str)
-
-    else:
-        display(Markdown(markdown_str))
-        if debug:
-            print(markdown_str)
-
-
-    # changes the unit format back to pretty
-    ureg.formatter.default_format = "~P"
+        if show and assignments:
+            options = self._options(options)
+            self.write(self.blocks(assignments, **options), options['report'])
+        return order
+
+    def emit(self, markdown_str: str):
+        """Sends the Markdown to the sink of the renderer or displays it."""
+        with stage_timer('display'):
+            if self.sink is not None:
+                self.sink(markdown_str)
+            else:
+                display_markdown(markdown_str)
+
+    def write(self, blocks, report=None, debug=False):
+        """Emits the Markdown blocks, or appends them to the report file."""
+        if report is None:
+            for markdown_str in blocks:
+                self.emit(markdown_str)
+                if debug:
+                    print(markdown_str)
+            return
+        with open(report, 'a', encoding='utf-8') as file:
+            for markdown_str in blocks:
+                with stage_timer('display'):
+                    file.write(markdown_str + '\n\n')
+                    file.flush()
+                if debug:
+                    print(markdown_str)
+
+    def put_out(self, offset: int = 0, debug=False, **options):
+        """Constructs and displays the Markdown output of the current cell.
+
+        With block_rows the output is split into aligned blocks of at most
+        that many rows, which keeps MathJax and Pandoc fast for large cells.
+        stream=True emits each block as soon as it is rendered, report writes
+        the blocks to a Markdown file instead of the notebook.
+        """
+        options = self._options(options)
+        call_stats = self._call_stats()
+        with collect_stats(call_stats):
+            blocks = self.blocks(self.capture(offset), **options)
+            if not options['stream']:
+                blocks = list(blocks)
+            self.write(blocks, options['report'], debug)
+        self._add_stats(call_stats)
+
+    def put_out_async(self, offset: int = 0, debug=False, **options) -> Future:
+        """Like put_out, but the LaTeX is rendered in a worker thread.
+
+        The cell is captured immediately and a placeholder is displayed, which
+        is updated as soon as the rendering is done, so the cell returns
+        without waiting for sympy. Returns a Future of the Markdown string.
+        Values that are mutated in place afterwards may be shown changed.
+        Without a notebook frontend (sink or redirect_markdown) the output is
+        rendered before returning, to keep it in order.
+        """
+        call_stats = self._call_stats()
+        with collect_stats(call_stats):
+            assignments = self.capture(offset)
+        # The known names at the time of the call, later cells may add more
+        symbols = frozenset(self.expressions.names())
+        options = self._options(options)
+
+        def render():
+            with collect_stats(call_stats):
+                markdown_str = self.render(assignments, symbols, **options)
+            if debug:
+                print(markdown_str)
+            return markdown_str
+
+        if options['report'] is not None:
+            # The worker appends to the report file, one cell after the other
+            def write():
+                with collect_stats(call_stats):
+                    self.write(self.blocks(assignments, symbols, **options), options['report'], debug)
+                self._add_stats(call_stats)
+
+            return _render_executor().submit(write)
+
+        if self.sink is not None or _markdown_sink is not None:
+            future = _render_executor().submit(render)
+            with collect_stats(call_stats):
+                self.emit(future.result())
+            self._add_stats(call_stats)
+            return future
+
+        from IPython.display import display, Markdown
+        handle = display(Markdown('$\\dots$'), display_id=True)
+
+        def update(future):
+            self._add_stats(call_stats)
+            if future.exception() is None:
+                handle.update(Markdown(future.result()))
+            else:
+                handle.update(Markdown(f"`put_out_async failed: {future.exception()!r}`"))
+
+        future = _render_executor().submit(render)
+        future.add_done_callback(update)
+        return future
+
+# Renderer used by put_out, it shares global_expressions
+default_renderer = Renderer(global_expressions)
+
+def put_out(precision: float = 2, symbolic: bool = False, evaluate: bool = False, numeric: bool = True, offset: int = 0, rows: int = 3, style=None, debug=False, block_rows: int = None, stream: bool = False, report=None):
+    """Constructs and displays the final Markdown output (see Renderer.put_out)."""
+    default_renderer.put_out(offset=offset, debug=debug, precision=precision, symbolic=symbolic, evaluate=evaluate, numeric=numeric, rows=rows, style=style, block_rows=block_rows, stream=stream, report=report)
+
+def downstream(*variable_names) -> list:
+    """Returns the variables depending on the given ones, in topological order."""
+    return default_renderer.downstream(*variable_names)
+
+def recompute(*variable_names, show: bool = False, **options) -> list:
+    """Recomputes the variables depending on the changed ones (see Renderer.recompute)."""
+    return default_renderer.recompute(*variable_names, show=show, **options)
+
+def enable_render_stats() -> RenderStats:
+    """Starts collecting timing statistics of put_out, see render_stats()."""
+    return default_renderer.enable_stats()
+
+def disable_render_stats() -> RenderStats:
+    """Stops collecting statistics of put_out and returns them."""
+    return default_renderer.disable_stats()
+
+def render_stats() -> RenderStats:
+    """Returns the statistics of all put_out calls since enable_render_stats().
+
+    The stats of the last call are in default_renderer.last_stats. None if not
+    collecting.
+    """
+    return default_renderer.stats
+
+def put_out_async(precision: float = 2, symbolic: bool = False, evaluate: bool = False, numeric: bool = True, offset: int = 0, rows: int = 3, style=None, debug=False, block_rows: int = None, report=None) -> Future:
+    """Like put_out, but renders in a worker thread (see Renderer.put_out_async)."""
+    return default_renderer.put_out_async(offset=offset, debug=debug, precision=precision, symbolic=symbolic, evaluate=evaluate, numeric=numeric, rows=rows, style=style, block_rows=block_rows, report=report)
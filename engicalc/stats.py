@@ -0,0 +1,129 @@
+"""
+Zeitmessung der einzelnen Schritte von put_out (opt-in).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Stages of the render pipeline, in the order of the report. The symbolic.*
+# stages are part of 'symbolic', which also contains the cache lookups.
+STAGES = (
+    'capture',
+    'symbolic',
+    'symbolic.native',
+    'symbolic.substitute',
+    'symbolic.sympify',
+    'symbolic.latex',
+    'format_value',
+    'markdown',
+    'display',
+)
+
+# Statistics collected by the current thread, None if not collecting
+_local = threading.local()
+
+
+class RenderStats:
+    """Wall-clock time per stage and event counters of put_out calls.
+
+    Stats of several calls (or notebooks) are combined with merge() or +.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+
+    def add_time(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other):
+        """Adds the timings and counters of other to these stats."""
+        for stage, seconds in other.timings.items():
+            self.add_time(stage, seconds)
+        for name, n in other.counters.items():
+            self.count(name, n)
+        return self
+
+    def __add__(self, other):
+        return RenderStats().merge(self).merge(other)
+
+    def as_dict(self):
+        return {'timings': dict(self.timings), 'counters': dict(self.counters)}
+
+    def report(self):
+        """Returns the stats as a plain text table."""
+        stages = [stage for stage in STAGES if stage in self.timings]
+        stages += sorted(stage for stage in self.timings if stage not in STAGES)
+        lines = [f"{'stage':<22}{'seconds':>10}"]
+        for stage in stages:
+            lines.append(f"{stage:<22}{self.timings[stage]:>10.4f}")
+        lines.append(f"{'counter':<22}{'count':>10}")
+        for name in sorted(self.counters):
+            lines.append(f"{name:<22}{self.counters[name]:>10}")
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        total = sum(seconds for stage, seconds in self.timings.items() if '.' not in stage)
+        return f"RenderStats({self.counters.get('equations', 0)} equations, {total:.4f} s)"
+
+
+class _Timer:
+    __slots__ = ('stats', 'stage', 'start')
+
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.stats.add_time(self.stage, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+@contextmanager
+def collect(stats):
+    """Records the timers and counters of the current thread into stats."""
+    previous = getattr(_local, 'stats', None)
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+def active():
+    """Returns the stats collected by the current thread (or None)."""
+    return getattr(_local, 'stats', None)
+
+
+def timer(stage):
+    """Context manager adding the elapsed time to the stage, if collecting."""
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        return _NO_TIMER
+    return _Timer(stats, stage)
+
+
+def count(name, n=1):
+    """Increments a counter, if collecting."""
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.count(name, n)
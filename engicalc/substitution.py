@@ -0,0 +1,190 @@
+"""
+Umschreibung der Python-Ausdrücke für sympify in einem Durchgang.
+"""
+
+import re
+from functools import lru_cache
+
+# Module prefixes which are dropped, e.g. np.sqrt(x) -> sqrt(x)
+MODULE_PREFIXES = {'np', 'math', 'ecc', 'Beton'}
+
+# Unit registries, their factors are removed, e.g. 30*un.mm -> 30
+UNIT_MODULES = {'un', 'ureg'}
+
+# Attributes which are dropped, e.g. the magnitude of a pint quantity
+STRIPPED_ATTRIBUTES = {'m', 'magnitude'}
+
+# Identifiers which are renamed for sympy
+RENAMES = {
+    'array': 'Matrix',
+    'abs': 'Abs',  # in sympy absolute value is defined with Abs
+}
+
+# Operators which are replaced
+OPERATORS = {
+    '@': '*',
+}
+
+# Parts of variable names (separated by _), e.g. d_com_x -> d_,_x
+NAME_PARTS = {
+    'com': ',',
+    'diam': r'\oslash',
+    'eps': 'varepsilon',  # convenience
+    'infty': r'\infty',
+}
+
+# Parts which are joined to the previous part, e.g. M_apos -> Mprime
+SUFFIX_PARTS = {
+    'apos': 'prime',
+}
+
+_version = 0
+
+
+def _alternatives(words) -> str:
+    # Longest first, so that a prefix does not shadow a longer word
+    if not words:
+        return '(?!)'
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+@lru_cache(maxsize=1)
+def _pattern(version: int):
+    # One scanner for all rules: numbers and strings (kept as they are), names
+    # and attribute chains including unit conversions, with the operator in
+    # front and the exponent behind (for unit factors), and the operators
+    return re.compile(r"""
+        \d[\w.]*
+      | "[^"\\]*(?:\\.[^"\\]*)*" | '[^'\\]*(?:\\.[^'\\]*)*'
+      | ([*/]\s*)?
+        ([A-Za-z_]\w*(?:\s*\.\s*(?:to\s*\((?:[^()]|\([^()]*\))*\)|[A-Za-z_]\w*))*)
+        (\s*\*\*\s*[\d.]+(?:[eE][+-]?\d+)?)?
+      | %s
+    """ % _alternatives(OPERATORS), re.VERBOSE)
+
+
+CONVERSION = re.compile(r'\s*\.\s*to\s*\((?:[^()]|\([^()]*\))*\)')
+
+
+@lru_cache(maxsize=4096)
+def convert_name(name: str) -> str:
+    """Applies NAME_PARTS and SUFFIX_PARTS to the parts of a variable name."""
+    converted = []
+    for i, part in enumerate(name.split('_')):
+        if i > 0 and part in SUFFIX_PARTS:
+            converted[-1] += SUFFIX_PARTS[part]
+        else:
+            converted.append(NAME_PARTS.get(part, part))
+    return '_'.join(converted)
+
+
+def symbol_literal(name: str) -> str:
+    """Returns the sympify source of a plain symbol."""
+    return 'Symbol("%s")' % name.replace('\\', '\\\\')
+
+
+@lru_cache(maxsize=4096)
+def _rewrite_identifier(name: str, known: bool) -> str:
+    if known:
+        return symbol_literal(convert_name(name))
+    if name in RENAMES:
+        return RENAMES[name]
+    converted = convert_name(name)
+    return name if converted == name else symbol_literal(converted)
+
+
+def _rewrite_name(operator, chain, exponent, symbols) -> str:
+    if '(' in chain:
+        # Unit conversions x.to(...) are removed
+        chain = CONVERSION.sub('', chain)
+    parts = chain.split('.')
+    if len(parts) == 1:
+        name = chain
+    else:
+        parts = [part.strip() for part in parts]
+        if parts[0] in UNIT_MODULES:
+            # Unit factor, together with the operator and the exponent
+            return ''
+        if parts[0] in MODULE_PREFIXES:
+            parts = parts[1:]
+        name = parts[0]
+
+    text = _rewrite_identifier(name, name in symbols)
+    attributes = [part for part in parts[1:] if part not in STRIPPED_ATTRIBUTES]
+    if attributes:
+        text = '.'.join([text] + attributes)
+    return (operator or '') + text + (exponent or '')
+
+
+def substitute(expr: str, symbols=()) -> str:
+    """Rewrites a Python expression into sympify source in a single scan.
+
+    Unit factors and conversions are removed, module prefixes and magnitude
+    accessors dropped, identifiers renamed and the variable names in symbols
+    (and names using the NAME_PARTS conventions) turned into plain symbols.
+    Only whole identifiers and attribute chains are matched, strings and
+    numbers are left as they are.
+    """
+    def replace(match):
+        operator, chain, exponent = match.groups()
+        if chain is None:
+            token = match.group()
+            return OPERATORS.get(token, token)
+        if operator is None and exponent is None and chain.isidentifier():
+            # Plain names, the most common case
+            return _rewrite_identifier(chain, chain in symbols)
+        return _rewrite_name(operator, chain, exponent, symbols)
+
+    return _pattern(_version).sub(replace, expr)
+
+
+def rules_version() -> int:
+    """Changes whenever a rule is registered, part of the render cache keys."""
+    return _version
+
+
+def _changed():
+    global _version
+    _version += 1
+    convert_name.cache_clear()
+    _rewrite_identifier.cache_clear()
+
+
+def register_module(prefix: str):
+    """Drops the module prefix in front of names, e.g. register_module('sia')."""
+    MODULE_PREFIXES.add(prefix)
+    _changed()
+
+
+def register_unit_module(name: str):
+    """Removes the factors of another unit registry, e.g. register_unit_module('u')."""
+    UNIT_MODULES.add(name)
+    _changed()
+
+
+def register_attribute(attribute: str):
+    """Drops an attribute like the magnitude accessor .m."""
+    STRIPPED_ATTRIBUTES.add(attribute)
+    _changed()
+
+
+def register_rename(name: str, replacement: str):
+    """Renames an identifier which is not a captured variable."""
+    RENAMES[name] = replacement
+    _changed()
+
+
+def register_operator(operator: str, replacement: str):
+    """Replaces an operator, e.g. register_operator('//', '/')."""
+    OPERATORS[operator] = replacement
+    _changed()
+
+
+def register_name_part(part: str, replacement: str, suffix: bool = False):
+    """Adds a variable name convention, e.g. register_name_part('tot', 'total').
+
+    With suffix=True the replacement is joined to the previous part, like
+    _apos -> prime.
+    """
+    (SUFFIX_PARTS if suffix else NAME_PARTS)[part] = replacement
+    _changed()
@@ -0,0 +1,210 @@
+"""
+Symboltabelle für alle Variablen, die mit put_out() ausgegeben wurden.
+"""
+
+import heapq
+from contextlib import contextmanager
+
+
+def fingerprint(value):
+    """Returns a comparable snapshot of a result, None if it is unknown.
+
+    Arrays are fingerprinted by their content, so in-place changes are
+    detected. Values of unknown types never compare equal.
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, str)):
+        return (type(value), value)
+    if hasattr(value, 'magnitude') and hasattr(value, 'units'):
+        magnitude = fingerprint(value.magnitude)
+        return None if magnitude is None else ('quantity', str(value.units), magnitude)
+    if hasattr(value, 'tobytes') and hasattr(value, 'dtype'):
+        if value.dtype.kind == 'O':
+            return None
+        return (type(value), value.dtype.str, value.shape, hash(value.tobytes()))
+    if isinstance(value, (list, tuple)):
+        items = tuple(fingerprint(item) for item in value)
+        return None if None in items else (type(value), items)
+    return None
+
+
+class SymbolTable:
+    """Indexed table of the captured variables (name -> entry).
+
+    Entries are dicts with the keys 'variable_name', 'expression', 'result',
+    'dependencies' (the known variables used by the expression) and
+    'revision' (changes whenever the expression, the result or the
+    dependencies change). The insertion order is kept, so iterating the table
+    yields the entries in the order the variables were first defined.
+
+    The dependencies form a graph, downstream() returns the variables which
+    depend on a changed one in the order they can be recomputed.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        # name -> names whose expression uses it
+        self._dependents = {}
+        # name -> definition order
+        self._position = {}
+        self._revision = 0
+
+    def update(self, variable_name, expression, result, dependencies=None):
+        """Updates an existing entry or appends a new one.
+
+        dependencies are the variable names used by the expression, only the
+        ones in the table are kept. None keeps the previous dependencies.
+        Returns True if the entry is new or has changed.
+        """
+        entry = self._entries.get(variable_name)
+        if dependencies is not None:
+            dependencies = tuple(
+                name for name in dependencies if name in self._entries and name != variable_name
+            )
+        result_fingerprint = fingerprint(result)
+
+        if entry is not None:
+            if dependencies is None:
+                dependencies = entry['dependencies']
+            unchanged = (
+                entry['expression'] == expression
+                and entry['dependencies'] == dependencies
+                and result_fingerprint is not None
+                and entry['fingerprint'] == result_fingerprint
+            )
+            entry['result'] = result
+            if unchanged:
+                return False
+            self._link(variable_name, entry['dependencies'], dependencies)
+            entry['expression'] = expression
+            entry['dependencies'] = dependencies
+            entry['fingerprint'] = result_fingerprint
+            entry['revision'] = self._next_revision()
+            return True
+
+        dependencies = dependencies or ()
+        self._entries[variable_name] = {
+            'variable_name': variable_name,
+            'expression': expression,
+            'result': result,
+            'dependencies': dependencies,
+            'fingerprint': result_fingerprint,
+            'revision': self._next_revision()
+        }
+        self._position[variable_name] = len(self._position)
+        self._link(variable_name, (), dependencies)
+        return True
+
+    def _next_revision(self):
+        self._revision += 1
+        return self._revision
+
+    def _link(self, variable_name, old, new):
+        for name in old:
+            self._dependents.get(name, set()).discard(variable_name)
+        for name in new:
+            self._dependents.setdefault(name, set()).add(variable_name)
+
+    def get(self, variable_name, default=None):
+        return self._entries.get(variable_name, default)
+
+    def expression(self, variable_name, default=None):
+        """Returns the stored expression of a variable."""
+        entry = self._entries.get(variable_name)
+        if entry is None:
+            return default
+        return entry['expression']
+
+    def dependencies(self, variable_name):
+        """Returns the variables used by the expression of a variable."""
+        return self._entries[variable_name]['dependencies']
+
+    def dependents(self, variable_name):
+        """Returns the variables whose expression uses the variable directly."""
+        return self._sorted(self._dependents.get(variable_name, ()))
+
+    def downstream(self, *variable_names):
+        """Returns all variables depending on the given ones, in topological order.
+
+        Only the affected part of the graph is visited. Variables which
+        depend on each other because one of them was redefined later are
+        ordered by their definition. Raises KeyError for variables which are
+        not in the table, e.g. if they were never shown with put_out().
+        """
+        unknown = [name for name in variable_names if name not in self._entries]
+        if unknown:
+            raise KeyError(f"Unknown variable(s) {', '.join(unknown)}, only variables shown with put_out() are tracked")
+
+        affected = set()
+        pending = list(variable_names)
+        while pending:
+            for name in self._dependents.get(pending.pop(), ()):
+                if name not in affected:
+                    affected.add(name)
+                    pending.append(name)
+
+        # Kahn's algorithm on the affected subgraph, ties in definition order
+        waiting = {
+            name: sum(1 for dependency in self._entries[name]['dependencies'] if dependency in affected)
+            for name in affected
+        }
+        position = self._position
+        ready = [(position[name], name) for name, count in waiting.items() if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, name = heapq.heappop(ready)
+            order.append(name)
+            for dependent in self._dependents.get(name, ()):
+                if dependent in waiting:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0:
+                        heapq.heappush(ready, (position[dependent], dependent))
+        if len(order) < len(affected):
+            done = set(order)
+            order += self._sorted(name for name in affected if name not in done)
+        return order
+
+    def _sorted(self, names):
+        # Definition order of the variables
+        return sorted(names, key=self._position.__getitem__)
+
+    def reset(self):
+        """Removes all entries, e.g. at the start of a new notebook."""
+        self._entries.clear()
+        self._dependents.clear()
+        self._position.clear()
+
+    @contextmanager
+    def scope(self):
+        """Variables defined inside the block are dropped when it is left.
+
+        Useful for sections of a notebook that reuse variable names without
+        affecting the rest of the sheet.
+        """
+        saved = {name: dict(entry) for name, entry in self._entries.items()}
+        try:
+            yield self
+        finally:
+            self._entries = saved
+            self._dependents = {}
+            self._position = {name: index for index, name in enumerate(saved)}
+            for name, entry in saved.items():
+                self._link(name, (), entry['dependencies'])
+
+    def names(self):
+        return list(self._entries)
+
+    def __contains__(self, variable_name):
+        return variable_name in self._entries
+
+    def __getitem__(self, variable_name):
+        return self._entries[variable_name]
+
+    def __iter__(self):
+        return iter(list(self._entries.values()))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"SymbolTable({len(self)} variables)"
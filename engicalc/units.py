@@ -2,10 +2,15 @@
 Definiert alle relevanten Einheiten.
 """
 
-from pint import UnitRegistry
+from pint import DimensionalityError, UnitRegistry
 
-# Erstellen eines UnitRegistry-Objekts
-ureg = UnitRegistry()
+# Erstellen eines UnitRegistry-Objekts, die Definitionen werden beim ersten
+# Start im Cache-Ordner von pint abgelegt und danach von dort geladen
+try:
+    ureg = UnitRegistry(cache_folder=":auto:")
+except OSError:
+    # Kein beschreibbarer Cache-Ordner vorhanden
+    ureg = UnitRegistry()
 ureg.formatter.default_format = "~P"
 
 ureg.define('Nm = newton * meter')
@@ -41,4 +46,244 @@ K = ureg.kelvin
 MPa = ureg.MPa
 los = ureg.dimensionless
 
-K = ureg.degK
\ No newline at end of file
+K = ureg.degK
+
+class UnitFunction:
+    """Function on pint quantities which is evaluated on the magnitudes.
+
+    The first call is evaluated with pint, which checks the dimensions, and
+    the dimensions of the arguments and the unit of the result are recorded.
+    Later calls convert every quantity to base units (SI), call the function
+    on the float or ndarray magnitudes and convert the result back to its
+    unit once, e.g. for load combinations over large arrays. Arguments of
+    another dimension raise a DimensionalityError like with pint.
+
+    The fast path is only used if the function gives the same results as
+    with pint, on the arguments of the first call and on independent probe
+    values, where the plain numbers (e.g. an exponent) are varied as well
+    and must not change the dimension of the result. Functions which use
+    units themselves, depend on the units of the magnitudes or use offset
+    units (degC) are always evaluated with pint. Arguments of type bool and
+    str (and None) are part of the signature, another value is checked like
+    a first call.
+
+    Only these probes are checked: a function whose result unit depends on
+    a plain number in a way they do not reveal (e.g. only above a threshold)
+    must not be compiled.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = getattr(func, '__name__', type(self).__name__)
+        self.__doc__ = getattr(func, '__doc__', None)
+        # Dimensionen der Argumente (None für Zahlen) und Einheit des
+        # Resultats, werden beim ersten Aufruf erfasst
+        self.signature = None
+        self._kinds = None
+        self.result_units = None
+        self.compiled = False
+        self._quantity = None
+        self._result_factor = 1.0
+        # Einheit -> (Faktor zur Basiseinheit, Dimension)
+        self._factors = {}
+
+    def __call__(self, *args, **kwargs):
+        kinds = _kinds(args, kwargs)
+        if kinds != self._kinds:
+            return self._compile(kinds, args, kwargs)
+        if not self.compiled:
+            return self.func(*args, **kwargs)
+
+        # Beträge in Basiseinheiten, Argumente einer anderen Dimension lösen
+        # wie bei pint einen DimensionalityError aus
+        dimensions, keyword_dimensions = self.signature
+        args = [self._base(value, dimension) for value, dimension in zip(args, dimensions)]
+        kwargs = {name: self._base(value, keyword_dimensions[name]) for name, value in kwargs.items()}
+        result = self.func(*args, **kwargs)
+        if self.result_units is None:
+            return result
+        if self._result_factor != 1.0:
+            result = result / self._result_factor
+        return self._quantity(result, self.result_units)
+
+    def _factor(self, units):
+        factor = self._factors.get(units)
+        if factor is None:
+            base = self._quantity(1.0, units).to_base_units()
+            factor = self._factors[units] = (base.magnitude, base.dimensionality)
+        return factor
+
+    def _base(self, value, dimension):
+        if dimension is None:
+            return value
+        factor, value_dimension = self._factor(value.units)
+        if value_dimension != dimension:
+            raise DimensionalityError(value.units, dimension, value_dimension, dimension)
+        magnitude = value.magnitude
+        return magnitude if factor == 1.0 else magnitude * factor
+
+    def _compile(self, kinds, args, kwargs):
+        # Auswertung mit pint, dabei werden die Dimensionen geprüft
+        result = self.func(*args, **kwargs)
+        self.signature = _signature(args, kwargs)
+        self._kinds = kinds
+        self.compiled = False
+        self._quantity = _quantity_type(args, kwargs, result)
+        self.result_units = getattr(result, 'units', None)
+        self._factors = {}
+        try:
+            self.compiled = self._check(args, kwargs, result)
+        except Exception:
+            pass
+        if self.compiled and self.result_units is not None:
+            self._result_factor = self._factor(self.result_units)[0]
+        return result
+
+    def _check(self, args, kwargs, result) -> bool:
+        if self._quantity is None or not _plain(result):
+            return False
+        quantities = [value for value in list(args) + list(kwargs.values()) if hasattr(value, 'units')]
+        units = [value.units for value in quantities]
+        if self.result_units is not None:
+            units.append(self.result_units)
+        if not all(_multiplicative(self._quantity, unit) for unit in units):
+            return False
+
+        # Gleiches Resultat mit den Argumenten des ersten Aufrufs ...
+        if not _same(self._raw(args, kwargs), _base_magnitude(result)):
+            return False
+
+        # ... und mit unabhängigen Werten ungleich null, z.B. zeigt erst
+        # f(1 kN, 0 N) = 1 kN nicht, dass a + b die Einheiten vermischt. Die
+        # Zahlen werden ebenfalls verändert, bei a**n hängt die Einheit von n ab
+        probes = iter(range(1, len(args) + len(kwargs) + 1))
+        def probe(value):
+            index = next(probes)
+            if hasattr(value, 'units'):
+                return self._quantity(_probe_magnitude(value.magnitude, index), value.units)
+            return _probe_number(value)
+        probe_args = [probe(value) for value in args]
+        probe_kwargs = {name: probe(value) for name, value in kwargs.items()}
+        expected = self.func(*probe_args, **probe_kwargs)
+        if _dimensionality(expected) != _dimensionality(result):
+            return False
+        return _plain(expected) and _same(self._raw(probe_args, probe_kwargs), _base_magnitude(expected))
+
+    def _raw(self, args, kwargs):
+        # Auswertung mit den Beträgen in Basiseinheiten
+        return self.func(
+            *[_base_magnitude(value) for value in args],
+            **{name: _base_magnitude(value) for name, value in kwargs.items()}
+        )
+
+    def __repr__(self):
+        return f"UnitFunction({self.__name__}, compiled={self.compiled})"
+
+
+def compile_units(func):
+    """Decorator, evaluates func on the magnitudes after a first checked call.
+
+    Example::
+
+        @compile_units
+        def M_Ed(q_d, l):
+            return q_d * l**2 / 8
+
+        M_Ed(10 * kN / m, np.linspace(1, 10, 1000) * m)
+    """
+    return UnitFunction(func)
+
+
+def _signature(args, kwargs):
+    dimension = lambda value: value.dimensionality if hasattr(value, 'units') else None
+    return (
+        tuple(dimension(value) for value in args),
+        {name: dimension(value) for name, value in kwargs.items()},
+    )
+
+
+def _kinds(args, kwargs):
+    # Welche Argumente Grössen sind und die Werte von bool, str und None,
+    # bei einer Änderung wird neu geprüft
+    return (
+        tuple(_kind(value) for value in args),
+        {name: _kind(value) for name, value in kwargs.items()},
+    )
+
+
+def _kind(value):
+    if hasattr(value, 'units'):
+        return True
+    if value is None or isinstance(value, (bool, str)):
+        return (type(value), value)
+    return False
+
+
+def _dimensionality(value):
+    return getattr(value, 'dimensionality', None)
+
+
+def _quantity_type(args, kwargs, result):
+    # Quantity-Klasse der Registry der Argumente
+    for value in (result,) + tuple(args) + tuple(kwargs.values()):
+        if hasattr(value, 'units'):
+            return type(value)
+    return None
+
+
+def _base_magnitude(value):
+    if hasattr(value, 'units'):
+        return value.to_base_units().magnitude
+    return value
+
+
+def _plain(result) -> bool:
+    # Nur einzelne Grössen, Zahlen und Arrays werden schnell ausgewertet
+    import numpy as np
+
+    magnitude = getattr(result, 'magnitude', result)
+    return isinstance(magnitude, (int, float, np.number, np.ndarray)) and not isinstance(magnitude, bool)
+
+
+def _multiplicative(quantity, units) -> bool:
+    # Einheiten mit Nullpunktverschiebung (degC) sind nicht proportional
+    try:
+        return quantity(0.0, units).to_base_units().magnitude == 0
+    except Exception:
+        return False
+
+
+def _probe_magnitude(magnitude, index):
+    import numpy as np
+
+    # Positive, für jedes Argument verschiedene Werte
+    value = 1 + 0.6180339887 * index
+    if isinstance(magnitude, np.ndarray):
+        return value * (1 + 0.1 * np.arange(magnitude.size).reshape(magnitude.shape) / max(magnitude.size, 1))
+    return value
+
+
+def _probe_number(value):
+    import numpy as np
+
+    # Andere Zahl des gleichen Typs, ganze Zahlen bleiben ganz
+    if isinstance(value, (bool, np.bool_)):
+        return value
+    if isinstance(value, (int, np.integer)):
+        return value + 1
+    if isinstance(value, (float, np.floating)):
+        return value * 1.3 + 0.7
+    return value
+
+
+def _same(raw, result) -> bool:
+    # Das Resultat mit den Beträgen muss dem Betrag des Resultats mit pint
+    # in Basiseinheiten entsprechen
+    import numpy as np
+
+    if hasattr(raw, 'units') or not _plain(raw):
+        return False
+    try:
+        return bool(np.all(np.isclose(raw, result, rtol=1e-9, atol=0, equal_nan=True)))
+    except (TypeError, ValueError):
+        return False